@@ -1,7 +1,14 @@
 """
 FastAPI 主应用
 """
+import asyncio
 import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -9,16 +16,12 @@ from backend.config import settings
 from backend.api.routes import skills, documents, chat, sessions, jobs
 from backend.api.routes import config as config_routes
 
-# 在模块加载时初始化 Skills（确保在 uvicorn reload 时也能正确加载）
 from backend.core.skills.registry import init_skills_from_directory
 from backend.models.database import get_database
+from backend.core.llm.http_client import close_http_client
+from backend.api.responses import DEFAULT_RESPONSE_CLASS
 
-# 初始化数据库
-get_database()
-
-# 加载 Skills
-_skill_count = init_skills_from_directory()
-print(f"[OK] Loaded {_skill_count} skills from files")
+logger = logging.getLogger("backend.api")
 
 # Logging（让应用内 logger.info 在 uvicorn 下可见）
 root_logger = logging.getLogger()
@@ -29,10 +32,67 @@ logging.getLogger("backend").setLevel(logging.INFO)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("httpcore").setLevel(logging.WARNING)
 
+# 请求路径只把日志放进队列，真正的 stderr 写入由后台线程（QueueListener）完成。
+# 只在 lifespan 内替换 root handlers：脚本或不走 lifespan 的导入仍按原 handlers 同步输出
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+
+
+def _install_queue_logging():
+    """把 root handlers 换成 QueueHandler 并启动监听线程；返回 (queue_handler, 原 handlers, listener)，已安装过则返回 None"""
+    if any(isinstance(h, QueueHandler) for h in root_logger.handlers):
+        return None
+    handlers = list(root_logger.handlers)
+    listener = QueueListener(_log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    queue_handler = QueueHandler(_log_queue)
+    for h in handlers:
+        root_logger.removeHandler(h)
+    root_logger.addHandler(queue_handler)
+    return queue_handler, handlers, listener
+
+
+def _restore_logging(installed) -> None:
+    """恢复原 handlers 后再停止监听线程：停止前队列中的日志会被写完，之后的日志直接走原 handlers"""
+    if installed is None:
+        return
+    queue_handler, handlers, listener = installed
+    for h in handlers:
+        root_logger.addHandler(h)
+    root_logger.removeHandler(queue_handler)
+    listener.stop()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    queue_logging = _install_queue_logging()
+    # 文件解析等 CPU 任务通过 asyncio.to_thread 执行，放大默认线程池以支持并发上传
+    workers = max(4, int(os.getenv("DEFAULT_THREADPOOL_WORKERS", "32")))
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+
+    # 初始化数据库 / 加载 Skills（放在 lifespan 中，避免阻塞模块导入与 reload）
+    await asyncio.to_thread(get_database)
+    skill_count = await asyncio.to_thread(init_skills_from_directory)
+    app.state.skills = skill_count
+    logger.info("[OK] Loaded %s skills from files", skill_count)
+    logger.info("[OK] %s v%s started", settings.APP_NAME, settings.APP_VERSION)
+    try:
+        yield
+    finally:
+        chat.shutdown_parse_pool()
+        chat.shutdown_render_pool()
+        await chat.close_search_client()
+        await close_http_client()
+        # 停止时把队列中剩余的日志写完，并恢复原 handlers
+        _restore_logging(queue_logging)
+
+
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="智能文书写作平台 API",
+    lifespan=lifespan,
+    # orjson 序列化更快且不转义中文；未安装时回退到标准 JSONResponse
+    default_response_class=DEFAULT_RESPONSE_CLASS,
 )
 
 # CORS 配置
@@ -67,12 +127,6 @@ async def health():
     return {"status": "healthy"}
 
 
-# 启动时初始化
-@app.on_event("startup")
-async def startup():
-    print(f"[OK] {settings.APP_NAME} v{settings.APP_VERSION} started")
-
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host=settings.API_HOST, port=settings.API_PORT)
@@ -0,0 +1,22 @@
+"""
+API response helpers.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Type
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+
+from backend.core.json_utils import ORJSON_AVAILABLE
+
+# orjson 序列化更快且不转义中文；未安装时回退到标准 JSONResponse
+# （FastAPI 0.131 起 ORJSONResponse 被标记弃用且每次使用都会告警，requirements 中已将 fastapi 限定在其之前）
+DEFAULT_RESPONSE_CLASS: Type[JSONResponse] = ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
+
+
+def json_response(payload: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """直接返回 Response：跳过 FastAPI 对返回值的 jsonable_encoder 逐层遍历（payload 须为 JSON 原生类型）"""
+    if ORJSON_AVAILABLE:
+        return ORJSONResponse(content=payload, headers=headers)
+    return JSONResponse(content=jsonable_encoder(payload), headers=headers)
@@ -2,24 +2,35 @@
 Chat API 路由
 处理与工作流的交互对话，支持流式输出
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from typing import Optional, List, Any, Dict
+from fastapi import APIRouter, HTTPException, UploadFile, File, Request
+from fastapi.responses import StreamingResponse, Response, FileResponse
+from pydantic import BaseModel, ConfigDict
+from typing import Optional, List, Any, Dict, AsyncIterator, Tuple
 from pathlib import Path
 import asyncio
+import bisect
 import re
+import html as html_lib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from collections import OrderedDict, deque
 import json
 import logging
 import time
 import datetime
 import base64
-import uuid
+import binascii
+import hashlib
 import os
+import tempfile
+import importlib.util
+import multiprocessing
+from functools import lru_cache, partial
 
 import httpx
 
 from backend.core.workflow import get_workflow
+from backend.core.workflow.state import DiagramRecord
 from backend.core.skills.registry import get_registry
 from backend.core.agents.file_extractor import (
     parse_uploaded_file,
@@ -28,35 +39,118 @@ from backend.core.agents.file_extractor import (
 )
 from backend.core.agents.skill_fixer_agent import SkillFixerAgent
 from backend.core.llm.config_store import has_llm_credentials, get_llm_config
+from backend.core.llm.http_client import HTTP2_AVAILABLE
+from backend.core.json_utils import ORJSON_AVAILABLE, orjson, loads_json as _loads_json
+from backend.api.responses import DEFAULT_RESPONSE_CLASS, json_response as _json_response
+from backend.core.diagrams.infographic import render_infographic_png_svg
+from backend.core.diagrams.openai_images import (
+    generate_image_png_via_openai_compatible,
+    review_image_via_openai_compatible,
+)
+
+# 图片转 data URI：pybase64 走 SIMD 编码，未安装时使用标准库（接口一致）
+try:
+    import pybase64 as _b64
+    PYBASE64_AVAILABLE = True
+except Exception:
+    _b64 = base64
+    PYBASE64_AVAILABLE = False
 
+# Web 搜索结果解析：优先 selectolax（lexbor 后端；1.0 起旧的 modest 后端已不可导入），其次 lxml，都没有时退回正则单遍扫描
 try:
-    import multipart  # noqa: F401
-    MULTIPART_AVAILABLE = True
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxHTMLParser
+    SELECTOLAX_AVAILABLE = True
 except Exception:
-    MULTIPART_AVAILABLE = False
+    SelectolaxHTMLParser = None
+    SELECTOLAX_AVAILABLE = False
+
+try:
+    from lxml import html as lxml_html
+    LXML_AVAILABLE = True
+except Exception:
+    lxml_html = None
+    LXML_AVAILABLE = False
+
+# 本模块的接口返回体较大（文件列表 / 搜索结果 / 整篇文档），显式使用 orjson 序列化，不依赖挂载它的 app 的默认值
+router = APIRouter(default_response_class=DEFAULT_RESPONSE_CLASS)
+
+
+@lru_cache(maxsize=1)
+def _has_multipart() -> bool:
+    """python-multipart 是否可用（只探测一次，不导入模块）"""
+    return importlib.util.find_spec("multipart") is not None
 
-router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
+# 支持的上传文件类型 / 允许上传的会话阶段
+_ALLOWED_EXT: frozenset[str] = frozenset({'.md', '.txt', '.doc', '.docx', '.pdf', '.pptx'})
+_UPLOAD_PHASES: frozenset[str] = frozenset({"init", "requirement"})
+
+# 文件列表接口返回的元数据字段（与 _handle_parsed_upload 写入的结构一致，不含 content 原文）
+_FILE_META_KEYS: tuple[str, ...] = ("filename", "content_type", "size", "extracted_fields")
+
+# 需要进程池解析的重格式；.md/.txt 很轻，继续走线程
+_HEAVY_PARSE_EXT: frozenset[str] = frozenset({'.doc', '.docx', '.pdf', '.pptx'})
+_PARSE_POOL_WORKERS = max(0, int(os.getenv("UPLOAD_PARSE_PROCESSES", str(min(os.cpu_count() or 4, 8)))))
+_PARSE_POOL: Optional[ProcessPoolExecutor] = None
+# 本地信息图渲染进程池（0 表示改用线程）
+_RENDER_POOL_WORKERS = max(0, int(os.getenv("INFOGRAPHIC_RENDER_PROCESSES", str(max(1, (os.cpu_count() or 2) // 2)))))
+_RENDER_POOL: Optional[ProcessPoolExecutor] = None
+
+# 上传材料总字数低于该值时不调用 LLM 做信息提取
+_UPLOAD_EXTRACTION_MIN_CHARS = int(os.getenv("UPLOAD_EXTRACTION_MIN_CHARS", "500"))
+
 _UPLOAD_PARSE_CONCURRENCY = max(1, min(int(os.getenv("UPLOAD_PARSE_CONCURRENCY", "4")), 12))
-_UPLOAD_SESSION_LOCKS: Dict[str, asyncio.Lock] = {}
-_UPLOAD_SESSION_LOCKS_GUARD = asyncio.Lock()
+_UPLOAD_SESSION_LOCKS: Dict[str, "_SessionSlot"] = {}
+# 图示/配图流程里直接调用 writer_agent._chat 的并发上限（超出的请求按到达顺序排队）
+_LLM_MAX_CONCURRENCY = max(1, int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+# 成图模型候选尺寸（按顺序尝试：首选横版，失败时才退到方图）
+_IMAGE_SIZES = ("1792x1024", "1024x1024")
+# 自动配图时同时生成的图数（max_images 上限为 4）
+_ILLUSTRATION_CONCURRENCY = max(1, int(os.getenv("ILLUSTRATION_CONCURRENCY", "4")))
+# 会话内保留的图示记录上限（每次保存都会整体序列化该列表）；超出时淘汰最早的记录及其文件，0 表示不限
+_SESSION_DIAGRAMS_MAX = max(0, int(os.getenv("SESSION_DIAGRAMS_MAX", "64")))
+_SSE_PING_INTERVAL_S = max(1.0, float(os.getenv("SSE_PING_INTERVAL", "15")))
+_SSE_PING_FRAME = b": ping\n\n"
+
+
+# Redact common token formats (best-effort)
+_SECRET_PATTERNS: List[tuple[re.Pattern, str]] = [
+    (re.compile(r"(sk-[A-Za-z0-9]{8,})"), "sk-***"),
+    (re.compile(r"(gho_[A-Za-z0-9]{8,})"), "gho_***"),
+    (re.compile(r"(Bearer\s+)[A-Za-z0-9._\-]{10,}"), r"\1***"),
+    (re.compile(r"(api[-_ ]?key\s*[:=]\s*)([^\s,;]+)", re.IGNORECASE), r"\1***"),
+    (re.compile(r"(\*{2,}[A-Za-z0-9]{2,})"), "***"),
+]
+
+# JSON 提取相关的正则，模块加载时编译一次
+_FENCE_RE = re.compile(r"```(?:json)?\s*([\s\S]*?)\s*```")
+_FENCE_OPEN_RE = re.compile(r"^```(?:json)?\s*")
+_FENCE_CLOSE_RE = re.compile(r"\s*```$")
+_JSON_OBJ_GREEDY_RE = re.compile(r"\{[\s\S]*\}")
+# 文件名只保留 ASCII 安全字符（Content-Disposition 头需要 latin-1 可编码）
+_UNSAFE_FILENAME_RE = re.compile(r"[^0-9a-zA-Z._-]+")
+# DuckDuckGo 结果页：标题链接与摘要合成一个模式，按文档顺序单遍扫描
+_DDG_RESULT_RE = re.compile(
+    r'<a[^>]+class="result__a"[^>]+href="(?P<href>[^"]+)"[^>]*>(?P<title>[\s\S]*?)</a>'
+    r'|class="result__snippet"[^>]*>(?P<snip>[\s\S]*?)</(?:a|div)>'
+)
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RUN_RE = re.compile(r"\s+")
+# 图示 / codegen 文本清洗（逐条 bullet 调用，预编译避免每次查 re 缓存）
+_HEADING_PREFIX_RE = re.compile(r"^[#\s]+")
+_HEADING_MARKUP_RE = re.compile(r"[`*_>\-]")
+_SUMMARY_SPLIT_RE = re.compile(r"[；;。\n]+")
+_POINT_SPLIT_RE = re.compile(r"[\n；;]+")
+_POINT_STRIP_CHARS = "•- \t"
 
 
 def _redact_secrets(message: str) -> str:
     if not message:
         return message
-    # Redact common token formats (best-effort)
-    patterns = [
-        (re.compile(r"(sk-[A-Za-z0-9]{8,})"), "sk-***"),
-        (re.compile(r"(gho_[A-Za-z0-9]{8,})"), "gho_***"),
-        (re.compile(r"(Bearer\\s+)[A-Za-z0-9._\\-]{10,}"), r"\\1***"),
-        (re.compile(r"(api[-_ ]?key\\s*[:=]\\s*)([^\\s,;]+)", re.IGNORECASE), r"\\1***"),
-        (re.compile(r"(\*{2,}[A-Za-z0-9]{2,})"), "***"),
-    ]
     sanitized = message
-    for pattern, replacement in patterns:
+    for pattern, replacement in _SECRET_PATTERNS:
         sanitized = pattern.sub(replacement, sanitized)
     return sanitized
 
@@ -66,17 +160,33 @@ def _ensure_llm_configured():
         raise HTTPException(status_code=400, detail="模型未配置")
 
 
+_SKILL_WRAP_MAX_DEPTH = 64
+
+
 def _resolve_skill_system_prompt(skill: Any) -> str:
-    """Best-effort extraction of system prompt from wrapped skills."""
+    """Best-effort extraction of system prompt from wrapped skills (cached per skill instance)."""
     if skill is None:
         return ""
 
-    queue: List[Any] = [skill]
+    cached = getattr(skill, "_resolved_system_prompt", None)
+    if isinstance(cached, str):
+        return cached
+    resolved = _walk_skill_system_prompt(skill)
+    try:
+        skill._resolved_system_prompt = resolved
+    except AttributeError:
+        pass
+    return resolved
+
+
+def _walk_skill_system_prompt(skill: Any) -> str:
+    queue: deque = deque([skill])
     seen: set[int] = set()
     fallback_guidelines = ""
 
-    while queue:
-        cur = queue.pop(0)
+    # 限制遍历规模，防止异常的包装链/循环引用
+    while queue and len(seen) < _SKILL_WRAP_MAX_DEPTH:
+        cur = queue.popleft()
         if cur is None:
             continue
         cur_id = id(cur)
@@ -110,19 +220,29 @@ def _resolve_skill_system_prompt(skill: Any) -> str:
     return fallback_guidelines
 
 
+# 请求/响应模型只读：冻结后禁止处理过程中被意外改写（Pydantic v2 默认已忽略多余字段、不做赋值校验）
+_API_MODEL_CONFIG = ConfigDict(extra="ignore", frozen=True)
+
+
 class StartSessionRequest(BaseModel):
     """开始会话请求"""
+    model_config = _API_MODEL_CONFIG
+
     skill_id: str
 
 
 class ChatRequest(BaseModel):
     """对话请求"""
+    model_config = _API_MODEL_CONFIG
+
     session_id: str
     message: str
 
 
 class SessionResponse(BaseModel):
     """会话响应"""
+    model_config = _API_MODEL_CONFIG
+
     session_id: str
     phase: str
     message: str
@@ -132,6 +252,8 @@ class SessionResponse(BaseModel):
 
 class UploadFilePayload(BaseModel):
     """JSON 上传文件"""
+    model_config = _API_MODEL_CONFIG
+
     filename: str
     content_base64: str
     content_type: Optional[str] = None
@@ -139,38 +261,65 @@ class UploadFilePayload(BaseModel):
 
 class UploadFilesRequest(BaseModel):
     """JSON 上传请求"""
+    model_config = _API_MODEL_CONFIG
+
     files: List[UploadFilePayload]
 
 
 class GenerateFieldRequest(BaseModel):
     """生成单个字段请求"""
+    model_config = _API_MODEL_CONFIG
+
     field_id: str
 
 
 class WebSearchRequest(BaseModel):
     """Web 搜索请求"""
+    model_config = _API_MODEL_CONFIG
+
     query: str
     top_k: int = 5
 
 
 class DiagramRequest(BaseModel):
     """生成图示请求"""
+    model_config = _API_MODEL_CONFIG
+
     title: Optional[str] = None
     diagram_type: str = "technical_route"  # technical_route | research_framework | freestyle | infographic
     mode: str = "infographic"  # infographic | image_model | auto
     # 选区生成：selected_text 为核心，context_text 为全文上下文
     selected_text: Optional[str] = None
     context_text: Optional[str] = None
+    # 是否在响应中额外返回 image_data_uri（markdown_snippet 已内嵌图片，png_url 可直接下载）
+    inline: bool = False
 
 
 class GenerateIllustrationsRequest(BaseModel):
     """自动生成配图请求（输入为整篇文章）"""
+    model_config = _API_MODEL_CONFIG
+
     document_content: str
     mode: str = "infographic"  # infographic | image_model | auto
     max_images: int = 2
 
 
-@router.post("/start", response_model=SessionResponse)
+def _session_response(result: dict) -> SessionResponse:
+    # workflow 产出的内部数据，跳过 Pydantic 校验直接构造
+    return SessionResponse.model_construct(
+        session_id=result["session_id"],
+        phase=result["phase"],
+        message=result["message"],
+        is_complete=result.get("is_complete", False),
+        document=result.get("document"),
+    )
+
+
+# response_model=None：避免 FastAPI 对返回值再做一次校验；responses 保留 OpenAPI 文档中的响应结构
+_SESSION_RESPONSE_DOC = {200: {"model": SessionResponse}}
+
+
+@router.post("/start", response_model=None, responses=_SESSION_RESPONSE_DOC)
 async def start_session(request: StartSessionRequest):
     """
     开始新会话
@@ -193,15 +342,10 @@ async def start_session(request: StartSessionRequest):
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
 
-    return SessionResponse(
-        session_id=result["session_id"],
-        phase=result["phase"],
-        message=result["message"],
-        is_complete=result["is_complete"],
-    )
+    return _session_response(result)
 
 
-@router.post("/message", response_model=SessionResponse)
+@router.post("/message", response_model=None, responses=_SESSION_RESPONSE_DOC)
 async def send_message(request: ChatRequest):
     """
     发送消息
@@ -216,16 +360,10 @@ async def send_message(request: ChatRequest):
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
 
-    return SessionResponse(
-        session_id=result["session_id"],
-        phase=result["phase"],
-        message=result["message"],
-        is_complete=result.get("is_complete", False),
-        document=result.get("document"),
-    )
+    return _session_response(result)
 
 
-@router.post("/generate/{session_id}")
+@router.post("/generate/{session_id}", response_model=None, responses=_SESSION_RESPONSE_DOC)
 async def generate_document(session_id: str):
     """
     生成文档（非流式）
@@ -240,13 +378,43 @@ async def generate_document(session_id: str):
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
 
-    return SessionResponse(
-        session_id=result["session_id"],
-        phase=result["phase"],
-        message=result["message"],
-        is_complete=result.get("is_complete", False),
-        document=result.get("document"),
-    )
+    return _session_response(result)
+
+
+def _sse_frame(event: dict) -> bytes:
+    """Encode one SSE data frame as bytes (orjson when available; UTF-8, no ASCII escaping)."""
+    if ORJSON_AVAILABLE:
+        # OPT_NON_STR_KEYS：与 json.dumps 一致地接受 int 等非字符串键，避免个别事件编码失败
+        return b"data: " + orjson.dumps(event, default=str, option=orjson.OPT_NON_STR_KEYS) + b"\n\n"
+    return f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n".encode("utf-8")
+
+
+async def _sse_with_keepalive(frames: AsyncIterator[bytes], interval: float = _SSE_PING_INTERVAL_S):
+    """Forward SSE frames; emit comment pings while the producer is idle (keeps proxies from timing out)."""
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def _pump():
+        try:
+            async for frame in frames:
+                await queue.put(frame)
+        finally:
+            await queue.put(done)
+
+    task = asyncio.create_task(_pump())
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(queue.get(), timeout=interval)
+            except asyncio.TimeoutError:
+                yield _SSE_PING_FRAME
+                continue
+            if frame is done:
+                break
+            yield frame
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
 
 
 @router.get("/generate/{session_id}/stream")
@@ -274,15 +442,15 @@ async def generate_document_stream(session_id: str):
     async def event_generator():
         try:
             async for event in workflow.generate_document_stream(session_id):
-                # 格式化为 SSE
-                data = json.dumps(event, ensure_ascii=False)
-                yield f"data: {data}\n\n"
+                # 格式化为 SSE（直接产出 bytes，省去 str -> bytes 的二次编码）
+                yield _sse_frame(event)
+                # 让出事件循环，确保每帧立即刷出，而不是被合并成几批到达客户端
+                await asyncio.sleep(0)
         except Exception as e:
-            error_event = json.dumps({"type": "error", "error": str(e)})
-            yield f"data: {error_event}\n\n"
+            yield _sse_frame({"type": "error", "error": str(e)})
 
     return StreamingResponse(
-        event_generator(),
+        _sse_with_keepalive(event_generator()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -292,8 +460,25 @@ async def generate_document_stream(session_id: str):
     )
 
 
+_SESSION_CACHE_CONTROL = "private, max-age=1, stale-while-revalidate=5"
+
+
+def _session_etag(session) -> str:
+    # 会话每次保存都会刷新 updated_at，配合消息数即可判断内容是否变化
+    return f'W/"{session.updated_at}-{len(session.messages)}"'
+
+
+def _session_cached_response(request: Request, session, build_payload) -> Response:
+    """带 ETag 的会话 GET 响应；If-None-Match 命中时直接 304，不再构造响应体"""
+    etag = _session_etag(session)
+    headers = {"ETag": etag, "Cache-Control": _SESSION_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return _json_response(build_payload(), headers)
+
+
 @router.get("/session/{session_id}")
-async def get_session(session_id: str):
+async def get_session(session_id: str, request: Request):
     """获取会话状态"""
     workflow = get_workflow()
     session = workflow.get_session(session_id)
@@ -301,7 +486,7 @@ async def get_session(session_id: str):
     if not session:
         raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
 
-    return {
+    return _session_cached_response(request, session, lambda: {
         "session_id": session.session_id,
         "skill_id": session.skill_id,
         "phase": session.phase,
@@ -309,11 +494,11 @@ async def get_session(session_id: str):
         "created_at": session.created_at,
         "updated_at": session.updated_at,
         "message_count": len(session.messages),
-    }
+    })
 
 
 @router.get("/session/{session_id}/messages")
-async def get_session_messages(session_id: str):
+async def get_session_messages(session_id: str, request: Request):
     """获取会话消息历史"""
     workflow = get_workflow()
     session = workflow.get_session(session_id)
@@ -321,14 +506,14 @@ async def get_session_messages(session_id: str):
     if not session:
         raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
 
-    return {
+    return _session_cached_response(request, session, lambda: {
         "session_id": session.session_id,
         "messages": session.messages,
-    }
+    })
 
 
 @router.get("/session/{session_id}/document")
-async def get_session_document(session_id: str):
+async def get_session_document(session_id: str, request: Request):
     """获取会话生成的文档"""
     workflow = get_workflow()
     session = workflow.get_session(session_id)
@@ -339,13 +524,19 @@ async def get_session_document(session_id: str):
     if not session.final_document:
         raise HTTPException(status_code=404, detail="Document not generated yet")
 
-    return {
+    return _session_cached_response(request, session, lambda: {
         "session_id": session.session_id,
         "document": session.final_document,
         "sections": session.sections,
-    }
+    })
+
+def _build_skill_fields(skill) -> tuple[dict, ...]:
+    # 字段定义只随 Skill 重新加载而变化，结果缓存在 Skill 实例上（注册表加载时重置）
+    # 返回的是共享的缓存对象，调用方只读使用（文件信息提取只读取字段定义），不再逐次复制
+    cached = getattr(skill, "_skill_fields_cache", None)
+    if cached is not None:
+        return cached
 
-def _build_skill_fields(skill) -> List[dict]:
     target_fields = list(skill.requirement_fields)
 
     collection_rank = {"required": 0, "infer": 1, "optional": 2}
@@ -356,7 +547,7 @@ def _build_skill_fields(skill) -> List[dict]:
             f.name,
         )
     )
-    return [
+    fields = [
         {
             "id": f.id,
             "name": f.name,
@@ -369,6 +560,65 @@ def _build_skill_fields(skill) -> List[dict]:
         }
         for f in target_fields
     ]
+    result = tuple(fields)
+    try:
+        skill._skill_fields_cache = result
+    except AttributeError:
+        pass
+    return result
+
+
+_JSON_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _json_candidates(text: str) -> tuple[List[str], List[str]]:
+    """
+    单遍括号配对扫描，取出文本中所有顶层的 {...} / [...] 片段（分别返回对象与数组候选）。
+    进入片段后才跟踪字符串与转义状态，片段内的括号不会被字符串中的 } / ] 截断；
+    括号不匹配或片段到结尾仍未闭合时，从该片段起点的下一个字符重新扫描，避免连带丢掉其中已配平的内层片段。
+    """
+    objects: List[str] = []
+    arrays: List[str] = []
+    stack: List[str] = []
+    start = 0
+    in_str = False
+    escaped = False
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if not stack:
+            if ch in _JSON_CLOSERS:
+                stack.append(_JSON_CLOSERS[ch])
+                start = i
+            i += 1
+            continue
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in _JSON_CLOSERS:
+            stack.append(_JSON_CLOSERS[ch])
+        elif ch == "}" or ch == "]":
+            if ch != stack.pop():
+                # 外层不成立：回到片段起点之后重扫
+                stack.clear()
+                i = start + 1
+                continue
+            if not stack:
+                (objects if ch == "}" else arrays).append(text[start:i + 1])
+        i += 1
+        if i == n and stack:
+            # 外层未闭合（如截断输出）：同样回到片段起点之后重扫
+            stack.clear()
+            in_str = escaped = False
+            i = start + 1
+    return objects, arrays
 
 
 def _try_parse_json_value(value: Any):
@@ -378,29 +628,38 @@ def _try_parse_json_value(value: Any):
     if not stripped:
         return value
 
-    candidates = []
-    if (stripped.startswith("{") and stripped.endswith("}")) or (stripped.startswith("[") and stripped.endswith("]")):
-        candidates.append(stripped)
-
-    fence_matches = re.findall(r"```(?:json)?\s*([\s\S]*?)\s*```", stripped)
-    candidates.extend(fence_matches)
-
-    for pattern in (r"\{[\s\S]*?\}", r"\[[\s\S]*?\]"):
-        match = re.search(pattern, stripped)
-        if match:
-            candidates.append(match.group())
-
-    for candidate in candidates:
+    # 先用廉价的字符判断挡掉普通短文本，只有疑似 JSON 时才走正则
+    first, last = stripped[0], stripped[-1]
+    if (first == "{" and last == "}") or (first == "[" and last == "]"):
         try:
-            return json.loads(candidate)
+            return _loads_json(stripped)
         except json.JSONDecodeError:
-            continue
+            pass
+
+    if "```" in stripped:
+        for candidate in _FENCE_RE.findall(stripped):
+            try:
+                return _loads_json(candidate)
+            except json.JSONDecodeError:
+                continue
+
+    if "{" in stripped or "[" in stripped:
+        # 对象优先于数组；嵌套结构按括号配对整体取出，不再被非贪婪正则截断在第一个右括号处
+        objects, arrays = _json_candidates(stripped)
+        for candidate in (*objects, *arrays):
+            try:
+                return _loads_json(candidate)
+            except json.JSONDecodeError:
+                continue
 
     return value
 
 
 def _flatten_list_value(values: list, field_type: str, field_id: str) -> str:
     separator = "\n" if field_type == "textarea" else "、"
+    # 常见情况是纯文本/数字列表：归一化不会改变它们，直接拼接
+    if all(_is_passthrough_value(item) for item in values):
+        return separator.join(str(item) for item in values if item is not None).strip()
     parts = []
     for item in values:
         normalized = _normalize_extracted_value(item, field_type, "", field_id)
@@ -410,8 +669,24 @@ def _flatten_list_value(values: list, field_type: str, field_id: str) -> str:
     return separator.join(parts).strip()
 
 
+# ASCII 部分：保留数字/小写字母，大写转小写，其余删除；非 ASCII 字符不在表中，原样保留待后续过滤
+_ASCII_KEY_TABLE = {
+    c: (c + 32 if 0x41 <= c <= 0x5A else c) if chr(c).isalnum() else None
+    for c in range(0x80)
+}
+
+
+@lru_cache(maxsize=4096)
+def _normalize_key_str(text: str) -> str:
+    out = text.translate(_ASCII_KEY_TABLE)
+    if out.isascii():
+        return out
+    # 非 ASCII 只保留 CJK 统一汉字
+    return "".join(ch for ch in out if ch < "\x80" or "\u4e00" <= ch <= "\u9fff")
+
+
 def _normalize_key(text: str) -> str:
-    return re.sub(r"[^0-9a-zA-Z\u4e00-\u9fff]+", "", str(text)).lower()
+    return _normalize_key_str(str(text))
 
 
 def _find_partial_key(tokens: list, key_lookup_normalized: dict) -> Optional[str]:
@@ -425,64 +700,160 @@ def _find_partial_key(tokens: list, key_lookup_normalized: dict) -> Optional[str
     return None
 
 
+# 开引号 -> 闭引号；顺序即同一 key 下的匹配优先级
+_KV_QUOTES = {'"': '"', "'": "'", "“": "”"}
+
+
+def _iter_kv_pairs(text: str):
+    """
+    单遍扫描 JSON 风格文本，产出 (quote, key, value)：
+    匹配 <q>key<q> 空白 : 空白 <q>value<q>（value 取到下一个闭引号为止，不处理转义）。
+    """
+    n = len(text)
+    i = 0
+    while i < n:
+        open_q = text[i]
+        close_q = _KV_QUOTES.get(open_q)
+        if close_q is None:
+            i += 1
+            continue
+        key_end = text.find(close_q, i + 1)
+        if key_end < 0:
+            i += 1
+            continue
+        j = key_end + 1
+        while j < n and text[j].isspace():
+            j += 1
+        if j < n and text[j] == ":":
+            j += 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j < n and text[j] == open_q:
+                value_end = text.find(close_q, j + 1)
+                if value_end >= 0:
+                    yield open_q, text[i + 1:key_end], text[j + 1:value_end]
+                    i = value_end + 1
+                    continue
+        # 未构成键值对：闭引号本身也可能是下一个键的开引号，逐字符前进
+        i += 1
+
+
 def _extract_value_from_unparsed_json(text: str, keys: list) -> Optional[str]:
     if not isinstance(text, str):
         return None
     if not keys:
         return None
 
-    for key in keys:
-        if not key:
-            continue
-        escaped = re.escape(str(key))
-        patterns = [
-            rf'"{escaped}"\s*:\s*"([\s\S]*?)"',
-            rf"'{escaped}'\s*:\s*'([\s\S]*?)'",
-            rf'“{escaped}”\s*:\s*“([\s\S]*?)”',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1).strip()
+    wanted = [str(k) for k in keys if k]
+    if not wanted:
+        return None
+    wanted_set = set(wanted)
+
+    # 一遍扫描记录每个 (key, 引号风格) 的首次出现，再按 keys 顺序取值
+    found: Dict[tuple, str] = {}
+    for quote, key, value in _iter_kv_pairs(text):
+        if key in wanted_set and (key, quote) not in found:
+            found[(key, quote)] = value
+
+    for key in wanted:
+        for quote in _KV_QUOTES:
+            value = found.get((key, quote))
+            if value is not None:
+                return value.strip()
 
     return None
 
 
-def _flatten_dict_value(value_map: dict, field_type: str, field_name: str, field_id: str) -> str:
+# 字典型提取值中常见的标题/正文键（按优先级排列）
+_TITLE_HINTS = ("name", "title", "名称", "标题", "题目")
+_CONTENT_KEYS = ("content", "正文", "内容", "text", "body", "detail", "details", "description", "summary", "简介", "说明", "背景")
+_TITLE_KEYS = ("title", "标题", "name", "名称", "topic", "subject", "项目名称", "课题名称")
+_TITLE_FIRST_KEY_ORDER = _TITLE_KEYS + _CONTENT_KEYS
+_CONTENT_FIRST_KEY_ORDER = _CONTENT_KEYS + _TITLE_KEYS
+_UNPARSED_TITLE_KEYS = ("title", "name", "标题", "名称", "topic", "subject", "项目名称", "课题名称", "project_title")
+
+
+def _is_plain_text(value: Any) -> bool:
+    """不含 JSON/代码块标记的字符串，归一化后必然原样返回，可直接取值"""
+    return isinstance(value, str) and not any(ch in value for ch in "{[`")
+
+
+def _is_passthrough_value(value: Any) -> bool:
+    """归一化后原样返回的值（None / 数字 / 布尔 / 纯文本），可跳过 _normalize_extracted_value"""
+    return value is None or isinstance(value, (int, float, bool)) or _is_plain_text(value)
+
+
+def _is_blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class _KeyIndex:
+    """字典键的查找表（小写 / 归一化），同一字典只构建一次"""
+
+    __slots__ = ("lookup", "norm_lookup")
+
+    def __init__(self, value_map: dict):
+        self.lookup = {str(k).lower(): k for k in value_map}
+        self.norm_lookup = {_normalize_key(k): k for k in value_map}
+
+
+def _get_key_index(value_map: dict, key_indexes: Optional[dict]) -> _KeyIndex:
+    if key_indexes is None:
+        return _KeyIndex(value_map)
+    # 同时保存字典本身的引用，防止临时字典被回收后 id 复用
+    entry = key_indexes.get(id(value_map))
+    if entry is not None and entry[0] is value_map:
+        return entry[1]
+    index = _KeyIndex(value_map)
+    key_indexes[id(value_map)] = (value_map, index)
+    return index
+
+
+def _flatten_dict_value(
+    value_map: dict,
+    field_type: str,
+    field_name: str,
+    field_id: str,
+    key_indexes: Optional[dict] = None,
+) -> str:
     if not value_map:
         return ""
 
     name_hint = (field_name or "").lower()
-    prefer_title = field_type != "textarea" and any(k in name_hint for k in ["name", "title", "名称", "标题", "题目"])
-    content_keys = ["content", "正文", "内容", "text", "body", "detail", "details", "description", "summary", "简介", "说明", "背景"]
-    title_keys = ["title", "标题", "name", "名称", "topic", "subject", "项目名称", "课题名称"]
+    prefer_title = field_type != "textarea" and any(k in name_hint for k in _TITLE_HINTS)
 
-    key_order = title_keys + content_keys if prefer_title else content_keys + title_keys
-    key_lookup = {str(k).lower(): k for k in value_map.keys()}
-    key_lookup_normalized = {_normalize_key(k): k for k in value_map.keys()}
+    key_order = _TITLE_FIRST_KEY_ORDER if prefer_title else _CONTENT_FIRST_KEY_ORDER
+    index = _get_key_index(value_map, key_indexes)
+    key_lookup = index.lookup
+    key_lookup_normalized = index.norm_lookup
     field_id_key = _normalize_key(field_id)
     field_name_key = _normalize_key(field_name)
 
+    def _norm(raw_value: Any) -> Any:
+        if _is_passthrough_value(raw_value):
+            return raw_value
+        return _normalize_extracted_value(raw_value, field_type, field_name, field_id, key_indexes)
+
     if field_id_key in key_lookup_normalized:
         raw_value = value_map.get(key_lookup_normalized[field_id_key])
-        normalized = _normalize_extracted_value(raw_value, field_type, field_name, field_id)
+        normalized = _norm(raw_value)
         return str(normalized).strip() if normalized is not None else ""
 
     if field_name_key and field_name_key in key_lookup_normalized:
         raw_value = value_map.get(key_lookup_normalized[field_name_key])
-        normalized = _normalize_extracted_value(raw_value, field_type, field_name, field_id)
+        normalized = _norm(raw_value)
         return str(normalized).strip() if normalized is not None else ""
 
     partial_key = _find_partial_key([field_id, field_name], key_lookup_normalized)
     if partial_key:
         raw_value = value_map.get(partial_key)
-        normalized = _normalize_extracted_value(raw_value, field_type, field_name, field_id)
+        normalized = _norm(raw_value)
         return str(normalized).strip() if normalized is not None else ""
 
     for key in key_order:
         if key in key_lookup:
             raw_value = value_map.get(key_lookup[key])
-            normalized = _normalize_extracted_value(raw_value, field_type, field_name, field_id)
+            normalized = _norm(raw_value)
             if normalized is None:
                 continue
             return str(normalized).strip()
@@ -490,40 +861,44 @@ def _flatten_dict_value(value_map: dict, field_type: str, field_name: str, field
     partial_key = _find_partial_key(key_order, key_lookup_normalized)
     if partial_key:
         raw_value = value_map.get(partial_key)
-        normalized = _normalize_extracted_value(raw_value, field_type, field_name, field_id)
+        normalized = _norm(raw_value)
         return str(normalized).strip() if normalized is not None else ""
 
     if len(value_map) == 1:
         only_value = next(iter(value_map.values()))
-        normalized = _normalize_extracted_value(only_value, field_type, field_name, field_id)
+        normalized = _norm(only_value)
         return str(normalized).strip() if normalized is not None else ""
 
     separator = "\n" if field_type == "textarea" else "，"
     parts = []
     for key, raw_value in value_map.items():
-        normalized = _normalize_extracted_value(raw_value, field_type, field_name, field_id)
+        normalized = _norm(raw_value)
         if normalized is None:
             continue
         parts.append(f"{key}: {normalized}")
     return separator.join(parts).strip()
 
 
-def _normalize_extracted_value(value: Any, field_type: str, field_name: str, field_id: str) -> Any:
+def _normalize_extracted_value(
+    value: Any,
+    field_type: str,
+    field_name: str,
+    field_id: str,
+    key_indexes: Optional[dict] = None,
+) -> Any:
     if value is None:
         return None
 
     parsed = _try_parse_json_value(value)
 
     if isinstance(parsed, dict):
-        return _flatten_dict_value(parsed, field_type, field_name, field_id)
+        return _flatten_dict_value(parsed, field_type, field_name, field_id, key_indexes)
     if isinstance(parsed, list):
         return _flatten_list_value(parsed, field_type, field_id)
     if isinstance(parsed, str):
         stripped = parsed.strip()
         if stripped.startswith("{") or stripped.startswith("["):
-            title_keys = ["title", "name", "标题", "名称", "topic", "subject", "项目名称", "课题名称", "project_title"]
-            content_keys = ["content", "正文", "内容", "text", "body", "detail", "details", "description", "summary", "简介", "说明", "背景"]
-            key_candidates = [field_id, field_name] + title_keys + content_keys
+            key_candidates = [field_id, field_name, *_UNPARSED_TITLE_KEYS, *_CONTENT_KEYS]
             extracted = _extract_value_from_unparsed_json(stripped, key_candidates)
             if extracted:
                 return extracted
@@ -536,12 +911,14 @@ def _normalize_extracted_fields(extracted_fields: Dict[str, Any], skill) -> Dict
         return {}
 
     field_map = {f.id: f for f in skill.requirement_fields}
+    # 多个字段共享同一个字典值时，键查找表只构建一次
+    key_indexes: dict = {}
     normalized = {}
     for field_id, value in extracted_fields.items():
         field = field_map.get(field_id)
         field_type = field.field_type if field else "text"
         field_name = field.name if field else field_id
-        normalized_value = _normalize_extracted_value(value, field_type, field_name, field_id)
+        normalized_value = _normalize_extracted_value(value, field_type, field_name, field_id, key_indexes)
         if normalized_value is None:
             continue
         if isinstance(normalized_value, str) and not normalized_value.strip():
@@ -550,115 +927,246 @@ def _normalize_extracted_fields(extracted_fields: Dict[str, Any], skill) -> Dict
     return normalized
 
 
+_NON_WS_RE = re.compile(r"\S")
+
+
+def _trim_text(text: str, max_chars: int) -> str:
+    """结果等同 (text or "").strip()[:max_chars]，但只复制需要保留的那一段，不再整篇 strip"""
+    if not text:
+        return ""
+    m = _NON_WS_RE.search(text)
+    if m is None:
+        return ""
+    start = m.start()
+    head = text[start:start + max_chars]
+    if _NON_WS_RE.search(text, start + max_chars) is None:
+        return head.rstrip()
+    return head
+
+
 def _trim_file_content(content: str, max_chars: int = 20000) -> str:
     """限制存储的文件内容长度，避免数据库过大"""
-    if not content:
+    return _trim_text(content, max_chars)
+
+
+class _SessionSlot:
+    """单个会话的写锁 + 使用计数（计数归零时从表中移除，避免锁表无限增长）"""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+@asynccontextmanager
+async def _upload_slot(session_id: str):
+    """Per-session lock for merge/save to avoid concurrent upload/requirements write conflicts."""
+    # 取槽位与计数之间没有 await，在事件循环内天然原子，无需全局 guard
+    slot = _UPLOAD_SESSION_LOCKS.get(session_id)
+    if slot is None:
+        slot = _UPLOAD_SESSION_LOCKS[session_id] = _SessionSlot()
+    slot.users += 1
+    try:
+        async with slot.lock:
+            yield
+    finally:
+        slot.users -= 1
+        if slot.users == 0 and _UPLOAD_SESSION_LOCKS.get(session_id) is slot:
+            del _UPLOAD_SESSION_LOCKS[session_id]
+
+
+# 每段 base64 长度为 4 的倍数，解码后约 64KB
+_B64_DECODE_CHUNK = 65536 // 3 * 4
+_UPLOAD_SPOOL_MAX_SIZE = 1024 * 1024
+# 单个上传文件的解码后大小上限（MB，0 表示不限）；超限的文件不解码、不解析
+_UPLOAD_MAX_FILE_BYTES = max(0, int(os.getenv("UPLOAD_MAX_FILE_MB", "50"))) * 1024 * 1024
+
+
+def _b64_decoded_size(data: str) -> int:
+    """不解码，按长度估算 base64 解码后的字节数（含空白时略偏大，仅用于超限判断）"""
+    return len(data) * 3 // 4 - data.endswith("=") - data.endswith("==")
+
+
+def _upload_too_large(size: Optional[int]) -> Optional[tuple[str, str]]:
+    if not _UPLOAD_MAX_FILE_BYTES or size is None or size <= _UPLOAD_MAX_FILE_BYTES:
+        return None
+    return "too_large", f"{size / 1048576:.1f}MB，上限 {_UPLOAD_MAX_FILE_BYTES // 1048576}MB"
+
+
+def _b64_stream_decode(data: str, out) -> int:
+    """Decode base64 into `out` chunk by chunk; returns decoded size."""
+    if len(data) % 4 or any(ch in data for ch in "\r\n \t"):
+        # 含换行/空白时分段会错位，退回一次性解码
+        out.write(binascii.a2b_base64(data))
+    else:
+        for i in range(0, len(data), _B64_DECODE_CHUNK):
+            out.write(binascii.a2b_base64(data[i:i + _B64_DECODE_CHUNK]))
+    size = out.tell()
+    out.seek(0)
+    return size
+
+
+def _parsed_upload_result(filename: str, content_type: Optional[str], size: int, text_content: str) -> Optional[dict]:
+    if not text_content:
+        return None
+    return {
+        "filename": filename,
+        "content": text_content,
+        "content_type": content_type or "",
+        "size": size,
+    }
+
+
+def _fmt_upload_summary(filename: str, parsed: Optional[dict], error: Optional[tuple[str, str]]) -> str:
+    """单个文件的处理结果 -> 展示给用户的摘要行"""
+    if error is not None:
+        kind, detail = error
+        if kind == "unsupported":
+            return f"❌ {filename}: 不支持的文件类型 ({detail})"
+        if kind == "too_large":
+            return f"❌ {filename}: 文件过大 ({detail})"
+        return f"❌ {filename}: 解析失败 - {detail}"
+    if parsed:
+        return f"✅ {filename}: 解析成功 ({len(parsed['content'])} 字符)"
+    return f"⚠️ {filename}: 文件为空或无法解析"
+
+
+def _decode_and_parse(file: UploadFilePayload, file_ext: str) -> Optional[dict]:
+    """Decode + parse one JSON upload; runs in a worker thread (CPU-bound)."""
+    # 解码到 SpooledTemporaryFile：大文件落盘，避免 base64 串与解码结果同时常驻内存
+    with tempfile.SpooledTemporaryFile(max_size=_UPLOAD_SPOOL_MAX_SIZE) as spool:
+        size = _b64_stream_decode(file.content_base64, spool)
+        text_content = parse_uploaded_file(spool, file_ext, file.filename)
+    return _parsed_upload_result(file.filename, file.content_type, size, text_content)
+
+
+def _pool_mp_context():
+    """进程池启动方式：服务进程里已有事件循环线程、httpx 连接池和 SQLite 连接，fork 会把锁状态一并复制进子进程，
+    故改用 forkserver（Windows 等不支持的平台用 spawn）；worker 只跑纯函数，不依赖从父进程继承的状态"""
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def _get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """PDF/DOCX/PPTX 解析受 GIL 限制，交给进程池才能多核并行；首次使用时才创建"""
+    global _PARSE_POOL
+    if _PARSE_POOL_WORKERS <= 0:
+        return None
+    if _PARSE_POOL is None:
+        _PARSE_POOL = ProcessPoolExecutor(max_workers=_PARSE_POOL_WORKERS, mp_context=_pool_mp_context())
+    return _PARSE_POOL
+
+
+def shutdown_parse_pool():
+    global _PARSE_POOL
+    if _PARSE_POOL is not None:
+        _PARSE_POOL.shutdown(wait=False, cancel_futures=True)
+        _PARSE_POOL = None
+
+
+async def _parse_bytes_in_pool(pool: ProcessPoolExecutor, content: bytes, file_ext: str, filename: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, parse_uploaded_file, content, file_ext, filename)
+
+
+def _ext(name: str) -> str:
+    """小写扩展名，语义同 Path(name).suffix.lower()，但只做字符串操作"""
+    base = name[name.rfind("/") + 1:]
+    i = base.rfind(".")
+    if i <= 0 or i == len(base) - 1:
         return ""
-    content = content.strip()
-    if len(content) <= max_chars:
-        return content
-    return content[:max_chars]
+    return base[i:].lower()
 
 
-async def _get_upload_session_lock(session_id: str) -> asyncio.Lock:
-    """Per-session lock for merge/save to avoid concurrent upload write conflicts."""
-    async with _UPLOAD_SESSION_LOCKS_GUARD:
-        lock = _UPLOAD_SESSION_LOCKS.get(session_id)
-        if lock is None:
-            lock = asyncio.Lock()
-            _UPLOAD_SESSION_LOCKS[session_id] = lock
-        return lock
+# 单文件解析结果：(文件名, 解析结果或 None, 错误 (kind, detail) 或 None)
+_UploadOutcome = tuple[str, Optional[dict], Optional[tuple[str, str]]]
 
 
 async def _parse_json_upload_file(
     idx: int,
     file: UploadFilePayload,
-    allowed_extensions: set[str],
-) -> tuple[int, Optional[dict], str]:
-    file_ext = Path(file.filename).suffix.lower()
+    allowed_extensions: frozenset[str],
+) -> _UploadOutcome:
+    file_ext = _ext(file.filename)
     if file_ext not in allowed_extensions:
-        return idx, None, f"❌ {file.filename}: 不支持的文件类型 ({file_ext})"
+        return file.filename, None, ("unsupported", file_ext)
+    too_large = _upload_too_large(_b64_decoded_size(file.content_base64))
+    if too_large is not None:
+        return file.filename, None, too_large
 
     try:
-        content = base64.b64decode(file.content_base64)
-        text_content = await asyncio.to_thread(parse_uploaded_file, content, file_ext, file.filename)
-        if text_content:
-            parsed = {
-                "filename": file.filename,
-                "content": text_content,
-                "content_type": file.content_type or "",
-                "size": len(content),
-            }
-            return idx, parsed, f"✅ {file.filename}: 解析成功 ({len(text_content)} 字符)"
-        return idx, None, f"⚠️ {file.filename}: 文件为空或无法解析"
+        pool = _get_parse_pool() if file_ext in _HEAVY_PARSE_EXT else None
+        if pool is not None:
+            # 进程间需要传 bytes：线程里解码，再交给进程池解析
+            content = await asyncio.to_thread(binascii.a2b_base64, file.content_base64)
+            text_content = await _parse_bytes_in_pool(pool, content, file_ext, file.filename)
+            parsed = _parsed_upload_result(file.filename, file.content_type, len(content), text_content)
+            return file.filename, parsed, None
+        # base64 解码同样是 CPU 密集操作，与解析一起放到线程池，避免阻塞事件循环
+        parsed = await asyncio.to_thread(_decode_and_parse, file, file_ext)
+        return file.filename, parsed, None
     except Exception as e:
-        return idx, None, f"❌ {file.filename}: 解析失败 - {str(e)}"
+        return file.filename, None, ("failed", str(e))
+
+
+def _parse_spooled_upload(fileobj, file_ext: str, filename: str) -> tuple[int, str]:
+    """Parse straight from the spooled upload file (no full read into memory); returns (size, text)."""
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    return size, parse_uploaded_file(fileobj, file_ext, filename)
 
 
 async def _parse_multipart_upload_file(
     idx: int,
     file: UploadFile,
-    allowed_extensions: set[str],
-) -> tuple[int, Optional[dict], str]:
+    allowed_extensions: frozenset[str],
+) -> _UploadOutcome:
     filename = file.filename or f"uploaded_{idx}"
-    file_ext = Path(filename).suffix.lower()
+    file_ext = _ext(filename)
     if file_ext not in allowed_extensions:
-        return idx, None, f"❌ {filename}: 不支持的文件类型 ({file_ext})"
+        return filename, None, ("unsupported", file_ext)
+    too_large = _upload_too_large(getattr(file, "size", None))
+    if too_large is not None:
+        return filename, None, too_large
 
     try:
-        content = await file.read()
-        text_content = await asyncio.to_thread(parse_uploaded_file, content, file_ext, filename)
-        if text_content:
-            parsed = {
-                "filename": filename,
-                "content": text_content,
-                "content_type": file.content_type or "",
-                "size": len(content),
-            }
-            return idx, parsed, f"✅ {filename}: 解析成功 ({len(text_content)} 字符)"
-        return idx, None, f"⚠️ {filename}: 文件为空或无法解析"
+        pool = _get_parse_pool() if file_ext in _HEAVY_PARSE_EXT else None
+        if pool is not None:
+            content = await file.read()
+            size = len(content)
+            text_content = await _parse_bytes_in_pool(pool, content, file_ext, filename)
+        else:
+            # UploadFile 底层是 SpooledTemporaryFile（大文件已落盘），直接交给解析器按流读取
+            size, text_content = await asyncio.to_thread(_parse_spooled_upload, file.file, file_ext, filename)
+        return filename, _parsed_upload_result(filename, file.content_type, size, text_content), None
     except Exception as e:
-        return idx, None, f"❌ {filename}: 解析失败 - {str(e)}"
+        return filename, None, ("failed", str(e))
 
 
-async def _parse_json_files_parallel(files: List[UploadFilePayload], allowed_extensions: set[str]) -> tuple[List[dict], List[str]]:
-    sem = asyncio.Semaphore(_UPLOAD_PARSE_CONCURRENCY)
+async def _parse_files_parallel(files: list, parse_one, allowed_extensions: frozenset[str]) -> tuple[List[dict], List[str]]:
+    # 固定数量的 worker 从迭代器中取文件，不再为每个文件创建一个 task；结果按下标写回，顺序与上传一致
+    results: List[Any] = [None] * len(files)
+    pending = iter(enumerate(files))
 
-    async def _worker(idx: int, file: UploadFilePayload):
-        async with sem:
-            return await _parse_json_upload_file(idx, file, allowed_extensions)
-
-    tasks = [asyncio.create_task(_worker(i, f)) for i, f in enumerate(files)]
-    results = await asyncio.gather(*tasks)
-    results.sort(key=lambda item: item[0])
-
-    parsed_files: List[dict] = []
-    file_summaries: List[str] = []
-    for _, parsed, summary in results:
-        file_summaries.append(summary)
-        if parsed:
-            parsed_files.append(parsed)
+    async def _worker():
+        for idx, file in pending:
+            results[idx] = await parse_one(idx, file, allowed_extensions)
+
+    await asyncio.gather(*(_worker() for _ in range(min(_UPLOAD_PARSE_CONCURRENCY, len(files)))))
+
+    # 摘要统一在最后格式化，worker 只返回结构化结果
+    file_summaries = [_fmt_upload_summary(*outcome) for outcome in results]
+    parsed_files = [parsed for _, parsed, _ in results if parsed]
     return parsed_files, file_summaries
 
 
-async def _parse_multipart_files_parallel(files: List[UploadFile], allowed_extensions: set[str]) -> tuple[List[dict], List[str]]:
-    sem = asyncio.Semaphore(_UPLOAD_PARSE_CONCURRENCY)
+async def _parse_json_files_parallel(files: List[UploadFilePayload], allowed_extensions: frozenset[str]) -> tuple[List[dict], List[str]]:
+    return await _parse_files_parallel(files, _parse_json_upload_file, allowed_extensions)
 
-    async def _worker(idx: int, file: UploadFile):
-        async with sem:
-            return await _parse_multipart_upload_file(idx, file, allowed_extensions)
-
-    tasks = [asyncio.create_task(_worker(i, f)) for i, f in enumerate(files)]
-    results = await asyncio.gather(*tasks)
-    results.sort(key=lambda item: item[0])
-
-    parsed_files: List[dict] = []
-    file_summaries: List[str] = []
-    for _, parsed, summary in results:
-        file_summaries.append(summary)
-        if parsed:
-            parsed_files.append(parsed)
-    return parsed_files, file_summaries
+
+async def _parse_multipart_files_parallel(files: List[UploadFile], allowed_extensions: frozenset[str]) -> tuple[List[dict], List[str]]:
+    return await _parse_files_parallel(files, _parse_multipart_upload_file, allowed_extensions)
 
 
 async def _handle_parsed_upload(
@@ -690,7 +1198,29 @@ async def _handle_parsed_upload(
     extraction_ms: Optional[int] = None
     llm_used: Optional[dict] = None
 
-    if has_llm_credentials():
+    # 廉价前置判断：材料太短，或非可选字段都已填写时，LLM 提取收益很低，直接跳过
+    total_chars = sum(len(pf.get("content") or "") for pf in parsed_files)
+    current_requirements = session.requirements or {}
+    missing_fields = [
+        f for f in skill_fields
+        if f.get("collection") != "optional" and _is_blank(current_requirements.get(f["id"]))
+    ]
+    skip_extraction = total_chars < _UPLOAD_EXTRACTION_MIN_CHARS or not missing_fields
+    llm_ready = has_llm_credentials()
+
+    if llm_ready and skip_extraction:
+        logger.info(
+            "[upload] skip llm extraction session=%s chars=%s missing_fields=%s",
+            session.session_id,
+            total_chars,
+            len(missing_fields),
+        )
+        extraction_result = {
+            "extracted_fields": {},
+            "external_information": " ".join(pf.get("content") or "" for pf in parsed_files)[:2000],
+            "summaries": "",
+        }
+    elif llm_ready:
         try:
             cfg = get_llm_config()
             llm_used = {
@@ -734,11 +1264,35 @@ async def _handle_parsed_upload(
     external_info = extraction_result.get("external_information", "")
     extracted_fields = extraction_result.get("extracted_fields", {})
     upload_message = f"📎 已上传 {len(parsed_files)} 个文件并提取信息：\n" + "\n".join(file_summaries)
-    merged_external_information = session.external_information or ""
+
+    # Skill-Fixer 调用较重，不持锁执行；先基于本地合并后的外部信息运行，
+    # 再与文件/需求/消息一起在锁内一次性落库（每次上传只写一次会话）。
+    overlay: Optional[dict] = None
+    if warning is None:
+        merged_external_information = "\n\n---\n\n".join(
+            x for x in (session.external_information or "", external_info) if x
+        )
+        try:
+            fixer = SkillFixerAgent()
+            fixer_result = await fixer.run(
+                skill=skill,
+                extracted_fields=extracted_fields,
+                external_information=merged_external_information,
+                file_summaries=extraction_result.get("summaries", ""),
+            )
+            overlay = {
+                "writing_guidelines_additions": fixer_result.writing_guidelines_additions,
+                "global_principles": fixer_result.global_principles,
+                "section_overrides": fixer_result.section_overrides,
+                "relax_requirements": fixer_result.relax_requirements,
+                "material_context": fixer_result.material_context,
+                "section_prompt_overrides": fixer_result.section_prompt_overrides,
+            }
+        except Exception as e:
+            logger.warning("[Skill Fixer Warning] session=%s: %s", session.session_id, e, exc_info=True)
 
     # Merge/save must be serialized per session; uploads may arrive concurrently.
-    session_lock = await _get_upload_session_lock(session.session_id)
-    async with session_lock:
+    async with _upload_slot(session.session_id):
         latest_session = workflow.get_session(session.session_id)
         if not latest_session:
             raise HTTPException(status_code=404, detail=f"Session not found: {session.session_id}")
@@ -758,47 +1312,22 @@ async def _handle_parsed_upload(
         if extracted_fields:
             if latest_session.requirements is None:
                 latest_session.requirements = {}
-            for field_id, value in extracted_fields.items():
-                if value is None:
-                    continue
-                if isinstance(value, str) and not value.strip():
-                    continue
-                existing_value = latest_session.requirements.get(field_id)
-                if existing_value is None or (isinstance(existing_value, str) and not existing_value.strip()):
-                    latest_session.requirements[field_id] = value
+            # extracted_fields 已由 _normalize_extracted_fields 去掉空值，这里只需跳过已填写的字段
+            requirements = latest_session.requirements
+            requirements.update({
+                field_id: value
+                for field_id, value in extracted_fields.items()
+                if _is_blank(requirements.get(field_id))
+            })
+
+        if overlay is not None:
+            latest_session.skill_overlay = overlay
 
         latest_session.messages.append({
             "role": "system",
             "content": upload_message,
         })
         workflow.save_session(latest_session)
-        merged_external_information = latest_session.external_information or ""
-
-    # Skill-Fixer 调用较重，不持锁执行；执行后再短暂持锁落库。
-    if warning is None:
-        try:
-            fixer = SkillFixerAgent()
-            fixer_result = await fixer.run(
-                skill=skill,
-                extracted_fields=extracted_fields,
-                external_information=merged_external_information,
-                file_summaries=extraction_result.get("summaries", ""),
-            )
-            overlay = {
-                "writing_guidelines_additions": fixer_result.writing_guidelines_additions,
-                "global_principles": fixer_result.global_principles,
-                "section_overrides": fixer_result.section_overrides,
-                "relax_requirements": fixer_result.relax_requirements,
-                "material_context": fixer_result.material_context,
-                "section_prompt_overrides": fixer_result.section_prompt_overrides,
-            }
-            async with session_lock:
-                latest_session = workflow.get_session(session.session_id)
-                if latest_session:
-                    latest_session.skill_overlay = overlay
-                    workflow.save_session(latest_session)
-        except Exception as e:
-            print(f"[Skill Fixer Warning] {e}")
 
     return {
         "success": True,
@@ -833,7 +1362,7 @@ async def upload_files_json(
     if not session:
         raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
 
-    if session.phase not in ["init", "requirement"]:
+    if session.phase not in _UPLOAD_PHASES:
         raise HTTPException(
             status_code=400,
             detail=f"Cannot upload files in phase: {session.phase}. Only allowed during requirement collection."
@@ -846,25 +1375,21 @@ async def upload_files_json(
     if not skill:
         raise HTTPException(status_code=404, detail=f"Skill not found: {session.skill_id}")
 
-    # 支持的文件类型
-    allowed_extensions = {'.md', '.txt', '.doc', '.docx', '.pdf', '.pptx'}
-
-    parsed_files, file_summaries = await _parse_json_files_parallel(payload.files, allowed_extensions)
+    parsed_files, file_summaries = await _parse_json_files_parallel(payload.files, _ALLOWED_EXT)
 
     try:
         return await _handle_parsed_upload(session, skill, workflow, parsed_files, file_summaries)
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        print(f"[File Upload Error] {traceback.format_exc()}")
+        logger.exception("[File Upload Error] session=%s", session_id)
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
 
-if MULTIPART_AVAILABLE:
+if _has_multipart():
     @router.post("/session/{session_id}/upload")
     async def upload_files(
         session_id: str,
@@ -884,7 +1409,7 @@ if MULTIPART_AVAILABLE:
         if not session:
             raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
 
-        if session.phase not in ["init", "requirement"]:
+        if session.phase not in _UPLOAD_PHASES:
             raise HTTPException(
                 status_code=400,
                 detail=f"Cannot upload files in phase: {session.phase}. Only allowed during requirement collection."
@@ -897,22 +1422,27 @@ if MULTIPART_AVAILABLE:
         if not skill:
             raise HTTPException(status_code=404, detail=f"Skill not found: {session.skill_id}")
 
-        # 支持的文件类型
-        allowed_extensions = {'.md', '.txt', '.doc', '.docx', '.pdf', '.pptx'}
-
-        parsed_files, file_summaries = await _parse_multipart_files_parallel(files, allowed_extensions)
+        parsed_files, file_summaries = await _parse_multipart_files_parallel(files, _ALLOWED_EXT)
 
         try:
             return await _handle_parsed_upload(session, skill, workflow, parsed_files, file_summaries)
         except HTTPException:
             raise
         except Exception as e:
-            import traceback
-            print(f"[File Upload Error] {traceback.format_exc()}")
+            logger.exception("[File Upload Error] session=%s", session_id)
             raise HTTPException(
                 status_code=500,
                 detail=str(e)
             )
+else:
+    # FastAPI 在声明 File(...) 参数时就要求 python-multipart，
+    # 缺失时仍注册同一路径并提示改用 JSON 上传接口；状态码保持 404（与未注册时一致），前端据此回退到 upload-json
+    @router.post("/session/{session_id}/upload")
+    async def upload_files(session_id: str):
+        raise HTTPException(
+            status_code=404,
+            detail="python-multipart not installed; use /session/{session_id}/upload-json instead",
+        )
 
 
 @router.get("/session/{session_id}/files")
@@ -925,15 +1455,15 @@ async def get_session_files(session_id: str):
         raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
 
     files = [
-        {k: v for k, v in file_info.items() if k != "content"}
+        {k: file_info[k] for k in _FILE_META_KEYS if k in file_info}
         for file_info in session.uploaded_files
     ]
 
-    return {
+    return _json_response({
         "session_id": session.session_id,
         "files": files,
         "external_information": session.external_information,
-    }
+    })
 
 
 @router.post("/session/{session_id}/generate-field")
@@ -956,7 +1486,11 @@ async def generate_field(session_id: str, request: GenerateFieldRequest):
     if not skill:
         raise HTTPException(status_code=404, detail=f"Skill not found: {session.skill_id}")
 
-    field = next((f for f in skill.requirement_fields if f.id == request.field_id), None)
+    field_index = getattr(skill, "_field_index", None)
+    if field_index is not None:
+        field = field_index.get(request.field_id)
+    else:
+        field = next((f for f in skill.requirement_fields if f.id == request.field_id), None)
     if not field:
         raise HTTPException(status_code=404, detail=f"Field not found: {request.field_id}")
 
@@ -1023,41 +1557,204 @@ def _format_search_sources(query: str, results: List[dict]) -> str:
     return "\n".join(lines).strip()
 
 
+_SEARCH_URL = "https://duckduckgo.com/html/"
+_SEARCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122 Safari/537.36",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.7",
+}
+_SEARCH_CLIENT: Optional[httpx.AsyncClient] = None
+_SEARCH_RESULT_MARKER = b'class="result__a"'
+_SEARCH_MAX_BYTES = 512 * 1024
+
+
+def _get_search_client() -> httpx.AsyncClient:
+    """Web 搜索专用的长连接 client（带固定 UA 头），多次搜索复用同一条 TLS 连接"""
+    global _SEARCH_CLIENT
+    if _SEARCH_CLIENT is None or _SEARCH_CLIENT.is_closed:
+        _SEARCH_CLIENT = httpx.AsyncClient(
+            headers=_SEARCH_HEADERS,
+            timeout=httpx.Timeout(connect=5.0, read=25.0, write=10.0, pool=5.0),
+            # keepalive_expiry 短于服务端空闲超时，避免复用到已被对端关闭的连接
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0),
+            follow_redirects=True,
+            http2=HTTP2_AVAILABLE,
+        )
+    return _SEARCH_CLIENT
+
+
+async def close_search_client():
+    global _SEARCH_CLIENT
+    if _SEARCH_CLIENT is not None:
+        await _SEARCH_CLIENT.aclose()
+        _SEARCH_CLIENT = None
+
+
+class _TTLCache:
+    """进程内 LRU + TTL 缓存（单事件循环内使用，无需加锁）；ttl 或 maxsize 为 0 时关闭"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Any) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        ts, value = item
+        if time.monotonic() - ts > self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Any, value: Any):
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+# 本地信息图缓存：相同输入直接复用 (raw_spec, png, svg, used_spec, render_type)
+_INFOGRAPHIC_CACHE = _TTLCache(
+    maxsize=max(0, int(os.getenv("INFOGRAPHIC_CACHE_SIZE", "256"))),
+    ttl=max(0.0, float(os.getenv("INFOGRAPHIC_CACHE_TTL", "1800"))),
+)
+
+
+def _infographic_cache_key(*parts: str) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        data = (part or "").encode("utf-8")
+        # 带长度前缀，避免不同切分拼出相同的字节串
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.digest()
+
+
+# 搜索结果缓存，键为 (归一化查询, top_k)；WEB_SEARCH_CACHE_TTL=0 关闭
+_SEARCH_CACHE = _TTLCache(
+    maxsize=max(0, int(os.getenv("WEB_SEARCH_CACHE_SIZE", "512"))),
+    ttl=max(0.0, float(os.getenv("WEB_SEARCH_CACHE_TTL", "600"))),
+)
+# 同一查询正在进行的上游请求：并发的相同查询共享一次调用（singleflight）
+_SEARCH_INFLIGHT: Dict[tuple[str, int], "asyncio.Future[List[dict]]"] = {}
+
+
 async def _duckduckgo_search(query: str, top_k: int = 5) -> List[dict]:
     q = (query or "").strip()
     if not q:
         return []
     top_k = max(1, min(int(top_k or 5), 10))
 
-    url = "https://duckduckgo.com/html/"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122 Safari/537.36",
-        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.7",
-    }
-    async with httpx.AsyncClient(headers=headers, timeout=30.0, follow_redirects=True) as client:
-        resp = await client.post(url, data={"q": q})
+    key = (_WS_RUN_RE.sub(" ", q).lower(), top_k)
+    cached = _SEARCH_CACHE.get(key)
+    if cached is None:
+        task = _SEARCH_INFLIGHT.get(key)
+        if task is None:
+            task = asyncio.ensure_future(_duckduckgo_fetch(q, top_k))
+            _SEARCH_INFLIGHT[key] = task
+
+            def _done(t: "asyncio.Future[List[dict]]", key=key):
+                _SEARCH_INFLIGHT.pop(key, None)
+                # 空结果可能是被限流，不缓存
+                if not t.cancelled() and t.exception() is None and t.result():
+                    _SEARCH_CACHE.put(key, t.result())
+
+            task.add_done_callback(_done)
+        # shield：某个调用方断开不影响其他等待同一结果的请求
+        cached = await asyncio.shield(task)
+    # 返回副本，调用方修改不会污染缓存
+    return [dict(r) for r in cached]
+
+
+async def _duckduckgo_fetch(q: str, top_k: int) -> List[dict]:
+    # 流式读取到 </html> 或字节上限为止。
+    # HTTP/1.1 下提前中断会让 httpx 关闭连接而不是放回连接池，为省几十 KB 丢掉长连接得不偿失；
+    # 只有 HTTP/2（中断只重置单个 stream）时，才在拿到 top_k 条之后的下一条结果后提前停止
+    buf = bytearray()
+    hits = 0
+    async with _get_search_client().stream("POST", _SEARCH_URL, data={"q": q}) as resp:
         resp.raise_for_status()
-        html = resp.text
+        encoding = resp.encoding or "utf-8"
+        early_exit = resp.http_version == "HTTP/2"
+        async for chunk in resp.aiter_bytes():
+            if early_exit:
+                # 从上一块末尾回退一点再计数，避免标记被切在两块之间
+                scan_from = max(0, len(buf) - len(_SEARCH_RESULT_MARKER) + 1)
+                buf.extend(chunk)
+                hits += buf.count(_SEARCH_RESULT_MARKER, scan_from)
+                if hits > top_k:
+                    break
+            else:
+                buf.extend(chunk)
+            if len(buf) >= _SEARCH_MAX_BYTES or b"</html>" in chunk:
+                break
+    html = buf.decode(encoding, errors="replace")
+
+    return _parse_search_results(html, top_k)
+
+
+def _clean_html_text(raw: str) -> str:
+    text = _HTML_TAG_RE.sub("", raw or "")
+    return _WS_RUN_RE.sub(" ", html_lib.unescape(text)).strip()
 
+
+def _parse_search_results(html: str, top_k: int) -> List[dict]:
     results: List[dict] = []
-    for m in re.finditer(r'<a[^>]+class="result__a"[^>]+href="([^"]+)"[^>]*>([\s\S]*?)</a>', html):
-        href = m.group(1)
-        raw_title = m.group(2)
-        title = re.sub(r"<[^>]+>", "", raw_title)
-        title = re.sub(r"\s+", " ", title).strip()
-
-        snippet = ""
-        tail = html[m.end(): m.end() + 2500]
-        sm = re.search(r'class="result__snippet"[^>]*>([\s\S]*?)</a>|class="result__snippet"[^>]*>([\s\S]*?)</div>', tail)
-        if sm:
-            raw = sm.group(1) or sm.group(2) or ""
-            snippet = re.sub(r"<[^>]+>", "", raw)
-            snippet = re.sub(r"\s+", " ", snippet).strip()
-
-        if href and title:
-            results.append({"title": title, "url": href, "snippet": snippet})
-        if len(results) >= top_k:
-            break
+    if SELECTOLAX_AVAILABLE:
+        for node in SelectolaxHTMLParser(html).css("div.result"):
+            a = node.css_first("a.result__a")
+            if a is None:
+                continue
+            href = a.attributes.get("href") or ""
+            # 不用 strip=True：它逐个文本节点去空白后直接拼接，<b> 高亮两侧的空格会丢失
+            title = _WS_RUN_RE.sub(" ", a.text() or "").strip()
+            s = node.css_first(".result__snippet")
+            snippet = _WS_RUN_RE.sub(" ", s.text() or "").strip() if s is not None else ""
+            if href and title:
+                results.append({"title": title, "url": href, "snippet": snippet})
+                if len(results) >= top_k:
+                    break
+        return results
+
+    if LXML_AVAILABLE:
+        try:
+            tree = lxml_html.fromstring(html)
+        except Exception:
+            tree = None
+        if tree is not None:
+            for node in tree.xpath('//div[contains(concat(" ", normalize-space(@class), " "), " result ")]'):
+                anchors = node.xpath('.//a[contains(concat(" ", normalize-space(@class), " "), " result__a ")]')
+                if not anchors:
+                    continue
+                href = anchors[0].get("href") or ""
+                title = _WS_RUN_RE.sub(" ", anchors[0].text_content()).strip()
+                snippets = node.xpath('.//*[contains(concat(" ", normalize-space(@class), " "), " result__snippet ")]')
+                snippet = _WS_RUN_RE.sub(" ", snippets[0].text_content()).strip() if snippets else ""
+                if href and title:
+                    results.append({"title": title, "url": href, "snippet": snippet})
+                    if len(results) >= top_k:
+                        break
+            return results
+
+    # 无 HTML 解析库：单遍扫描标题/摘要（按文档顺序，摘要归属到前一个标题）
+    current: Optional[dict] = None
+    for m in _DDG_RESULT_RE.finditer(html):
+        if m.group("href") is not None:
+            if current is not None:
+                results.append(current)
+                if len(results) >= top_k:
+                    return results
+            title = _clean_html_text(m.group("title"))
+            href = m.group("href")
+            current = {"title": title, "url": href, "snippet": ""} if (href and title) else None
+        elif current is not None and not current["snippet"]:
+            current["snippet"] = _clean_html_text(m.group("snip"))
+    if current is not None and len(results) < top_k:
+        results.append(current)
     return results
 
 
@@ -1094,53 +1791,128 @@ def _extract_json_obj(text: str) -> dict:
     raw = (text or "").strip()
     if not raw:
         return {}
-    raw = re.sub(r"^```(?:json)?\\s*", "", raw).strip()
-    raw = re.sub(r"\\s*```$", "", raw).strip()
+    # 只有带 ``` 围栏时才需要剥离；裸 JSON 直接解析
+    if raw.startswith("```"):
+        raw = _FENCE_OPEN_RE.sub("", raw)
+        raw = _FENCE_CLOSE_RE.sub("", raw).strip()
     try:
-        obj = json.loads(raw)
+        obj = _loads_json(raw)
         return obj if isinstance(obj, dict) else {}
     except Exception:
         pass
 
     # Best-effort: grab the largest {...} block
-    m = re.search(r"\\{[\\s\\S]*\\}", raw)
+    m = _JSON_OBJ_GREEDY_RE.search(raw)
     if not m:
         return {}
     try:
-        obj = json.loads(m.group(0))
+        obj = _loads_json(m.group(0))
         return obj if isinstance(obj, dict) else {}
     except Exception:
         return {}
 
 
-def _diagram_storage_dir(session_id: str) -> Path:
+def _diagram_dir(session_id: str) -> Path:
     from backend.config import DATA_DIR
-    p = Path(DATA_DIR) / "diagrams" / session_id
+    return Path(DATA_DIR) / "diagrams" / session_id
+
+
+@lru_cache(maxsize=512)
+def _diagram_storage_dir(session_id: str) -> Path:
+    """写入用：每个会话目录只 mkdir 一次"""
+    p = _diagram_dir(session_id)
     p.mkdir(parents=True, exist_ok=True)
     return p
 
 
-def _diagram_paths(session_id: str, diagram_id: str) -> tuple[Path, Path]:
-    d = _diagram_storage_dir(session_id)
+def _diagram_paths(session_id: str, diagram_id: str, *, create: bool = False) -> tuple[Path, Path]:
+    # 只读访问不建目录（文件不存在时 exists() 自然返回 False）
+    d = _diagram_storage_dir(session_id) if create else _diagram_dir(session_id)
     return d / f"{diagram_id}.png", d / f"{diagram_id}.svg"
 
 
+def _diagram_content_id(png_bytes: bytes, title: str) -> str:
+    """图示 id：PNG 内容 + 标题的 blake2b 摘要（不消耗系统随机数，相同内容得到相同 id）"""
+    return hashlib.blake2b(png_bytes, digest_size=16, key=(title or "").encode("utf-8")[:64]).hexdigest()
+
+
+def _write_diagram_assets(png_path: Path, png_bytes: bytes, svg_path: Path, svg_text: str) -> None:
+    # 文件已存在说明是同一内容的重复生成，跳过写盘
+    if not png_path.exists():
+        png_path.write_bytes(png_bytes)
+    if svg_text and not svg_path.exists():
+        svg_path.write_text(svg_text, encoding="utf-8")
+
+
+def _remove_diagram_assets(session_id: str, diagrams: List[Any]) -> None:
+    for d in diagrams:
+        did = d.get("id") if isinstance(d, dict) else None
+        if not did:
+            continue
+        for path in _diagram_paths(session_id, did):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+
 def _safe_filename(title: str, ext: str) -> str:
     name = (title or "diagram").strip() or "diagram"
-    safe = re.sub(r"[^\\u4e00-\\u9fff0-9a-zA-Z._-]+", "_", name).strip("_") or "diagram"
+    safe = _UNSAFE_FILENAME_RE.sub("_", name).strip("_") or "diagram"
     return f"{safe}.{ext}"
 
 
-def _diagram_asset_flags(session_id: str, diagram: dict) -> tuple[bool, bool]:
+def _scan_diagram_dir(session_id: str) -> set[str]:
+    """一次读取会话图示目录下的全部文件名（目录不存在时返回空集合）"""
+    try:
+        with os.scandir(_diagram_dir(session_id)) as it:
+            return {e.name for e in it}
+    except OSError:
+        return set()
+
+
+def _diagram_asset_flags(diagram: dict, names: set[str]) -> tuple[bool, bool]:
     did = diagram.get("id")
     if not did:
         return False, False
-    png_path, svg_path = _diagram_paths(session_id, did)
-    has_png = png_path.exists()
-    has_svg = svg_path.exists() or bool(diagram.get("has_svg")) or bool(diagram.get("svg"))
+    has_png = f"{did}.png" in names
+    has_svg = bool(diagram.get("has_svg")) or bool(diagram.get("svg")) or f"{did}.svg" in names
     return has_png, has_svg
 
 
+# 图示较多时把目录扫描与摘要构建挪到线程池，避免阻塞事件循环
+_DIAGRAM_STAT_INLINE_MAX = 8
+
+
+def _diagram_summaries(session_id: str, diagrams: Any) -> List[dict]:
+    out: List[dict] = []
+    names: Optional[set[str]] = None
+    for d in diagrams or []:
+        if not isinstance(d, dict):
+            continue
+        if names is None:
+            names = _scan_diagram_dir(session_id)
+        has_png, has_svg = _diagram_asset_flags(d, names)
+        out.append({
+            "id": d.get("id"),
+            "title": d.get("title"),
+            "diagram_type": d.get("diagram_type"),
+            "mode": d.get("mode") or ("infographic" if d.get("svg") else "unknown"),
+            "created_at": d.get("created_at"),
+            "has_png": has_png,
+            "has_svg": has_svg,
+            "png_url": f"/api/chat/session/{session_id}/diagrams/{d.get('id')}.png" if has_png else None,
+            "svg_url": f"/api/chat/session/{session_id}/diagrams/{d.get('id')}.svg" if has_svg else None,
+        })
+    return out
+
+
+async def _diagram_summaries_async(session_id: str, diagrams: Any) -> List[dict]:
+    if len(diagrams or []) <= _DIAGRAM_STAT_INLINE_MAX:
+        return _diagram_summaries(session_id, diagrams)
+    return await asyncio.to_thread(_diagram_summaries, session_id, list(diagrams))
+
+
 def _normalize_markdown_text(markdown: str) -> str:
     text = (markdown or "").replace("\r\n", "\n").replace("\r", "\n")
     lines = text.split("\n")
@@ -1162,6 +1934,19 @@ def _build_figure_markdown(title: str, data_uri: str) -> str:
     return f"![{t}]({data_uri})\n\n*图：{t}*"
 
 
+def _strip_bullet_prefix(s: str) -> str:
+    """去掉行首的 `1.` / `2)` / `3、` 编号，再去掉一个 `•` / `-` 项目符号（纯字符串操作，不走正则）"""
+    i = 0
+    n = len(s)
+    while i < n and s[i].isdecimal():
+        i += 1
+    if 0 < i < n and s[i] in ".)、":
+        s = s[i + 1:].lstrip()
+    if s[:1] in ("•", "-"):
+        s = s[1:].lstrip()
+    return s
+
+
 def _split_infographic_points(lines_text: str) -> List[str]:
     source = (lines_text or "").strip()
     if not source:
@@ -1171,8 +1956,7 @@ def _split_infographic_points(lines_text: str) -> List[str]:
         s = str(line or "").strip()
         if not s:
             continue
-        s = re.sub(r"^\d+[.)、]\s*", "", s)
-        s = re.sub(r"^[•\-]\s*", "", s)
+        s = _strip_bullet_prefix(s)
         s = s.strip("；; ")
         if s:
             pieces.append(s)
@@ -1232,33 +2016,51 @@ def _build_local_infographic_spec(
     return "technical_route", spec
 
 
-def _render_local_infographic_assets(
+def _get_render_pool() -> Optional[ProcessPoolExecutor]:
+    """Pillow 绘图持有 GIL；并发配图时交给进程池才能多核并行，首次使用时才创建"""
+    global _RENDER_POOL
+    if _RENDER_POOL_WORKERS <= 0:
+        return None
+    if _RENDER_POOL is None:
+        _RENDER_POOL = ProcessPoolExecutor(max_workers=_RENDER_POOL_WORKERS, mp_context=_pool_mp_context())
+    return _RENDER_POOL
+
+
+def shutdown_render_pool():
+    global _RENDER_POOL
+    if _RENDER_POOL is not None:
+        _RENDER_POOL.shutdown(wait=False, cancel_futures=True)
+        _RENDER_POOL = None
+
+
+async def _render_local_infographic_assets(
     *,
     diagram_type: str,
     raw_spec: dict,
     lines_text: str,
     title: str,
 ) -> tuple[bytes, str, dict, str]:
-    from backend.core.diagrams.infographic import render_infographic_png_svg
-
+    # 规格整理很轻，留在事件循环；真正的绘图在子进程（只需导入 infographic 模块）
     render_type, render_spec = _build_local_infographic_spec(
         diagram_type=diagram_type,
         raw_spec=raw_spec,
         lines_text=lines_text,
         title=title,
     )
-    png_bytes, svg_text, normalized_spec = render_infographic_png_svg(
-        render_type,
-        render_spec,
-        title=title,
-    )
+    pool = _get_render_pool()
+    if pool is None:
+        png_bytes, svg_text, normalized_spec = await asyncio.to_thread(
+            render_infographic_png_svg, render_type, render_spec, title=title
+        )
+    else:
+        loop = asyncio.get_running_loop()
+        png_bytes, svg_text, normalized_spec = await loop.run_in_executor(
+            pool, partial(render_infographic_png_svg, render_type, render_spec, title=title)
+        )
     return png_bytes, svg_text, normalized_spec, render_type
 
 
-def _build_codegen_schema_hint(diagram_type: str) -> str:
-    dt = (diagram_type or "").strip().lower()
-    if dt == "research_framework":
-        return """{
+_SCHEMA_RESEARCH_FRAMEWORK = """{
   "goal": {"title": "研究目标", "bullets": ["要点1", "要点2", "要点3"]},
   "hypotheses": {"title": "科学问题/假设", "bullets": ["要点1", "要点2", "要点3"]},
   "support": {"title": "支撑条件", "bullets": ["要点1", "要点2", "要点3"]},
@@ -1269,7 +2071,8 @@ def _build_codegen_schema_hint(diagram_type: str) -> str:
   ],
   "outcomes": {"title": "预期成果", "bullets": ["要点1", "要点2", "要点3"]}
 }"""
-    return """{
+
+_SCHEMA_TECHNICAL_ROUTE = """{
   "stages": [
     {"title": "阶段标题", "bullets": ["要点1", "要点2", "要点3"]},
     {"title": "阶段标题", "bullets": ["要点1", "要点2", "要点3"]},
@@ -1278,6 +2081,12 @@ def _build_codegen_schema_hint(diagram_type: str) -> str:
   ]
 }"""
 
+_CODEGEN_SCHEMAS = {"research_framework": _SCHEMA_RESEARCH_FRAMEWORK}
+
+
+def _build_codegen_schema_hint(diagram_type: str) -> str:
+    return _CODEGEN_SCHEMAS.get((diagram_type or "").strip().lower(), _SCHEMA_TECHNICAL_ROUTE)
+
 
 def _dedupe_text_list(items: Any, *, max_items: int = 4, max_len: int = 24) -> List[str]:
     if not isinstance(items, list):
@@ -1288,7 +2097,7 @@ def _dedupe_text_list(items: Any, *, max_items: int = 4, max_len: int = 24) -> L
         text = str(raw or "").strip()
         if not text:
             continue
-        text = re.sub(r"\s+", " ", text).strip()
+        text = _WS_RUN_RE.sub(" ", text).strip()
         if len(text) > max_len:
             text = text[:max_len].rstrip()
         key = _normalized_heading_text(text)
@@ -1301,20 +2110,19 @@ def _dedupe_text_list(items: Any, *, max_items: int = 4, max_len: int = 24) -> L
     return out
 
 
+# 按优先级取第一个可用的摘要字段
+_SUMMARY_POINT_KEYS = ("concise_summary", "summary_points", "summary", "outline")
+
+
 def _extract_codegen_summary_points(payload: dict) -> List[str]:
     if not isinstance(payload, dict):
         return []
-    candidates = [
-        payload.get("concise_summary"),
-        payload.get("summary_points"),
-        payload.get("summary"),
-        payload.get("outline"),
-    ]
-    for value in candidates:
+    for key in _SUMMARY_POINT_KEYS:
+        value = payload.get(key)
         if isinstance(value, list):
             return _dedupe_text_list(value, max_items=8, max_len=22)
         if isinstance(value, str) and value.strip():
-            parts = re.split(r"[；;。\n]+", value.strip())
+            parts = _SUMMARY_SPLIT_RE.split(value.strip())
             return _dedupe_text_list(parts, max_items=8, max_len=22)
     return []
 
@@ -1329,6 +2137,19 @@ def _extract_codegen_spec_block(payload: dict) -> dict:
     return payload
 
 
+def _entry_key(title: str, bullets: List[str]) -> str:
+    # 标题可用时不必再拼接 bullets
+    return _normalized_heading_text(title) or _normalized_heading_text(" ".join(bullets))
+
+
+def _push_unique(target: Dict[str, Any], key: str, value: Any) -> bool:
+    """有序 dict 同时充当 seen 集合与输出列表：key 为空或已存在时丢弃"""
+    if not key or key in target:
+        return False
+    target[key] = value
+    return True
+
+
 def _sanitize_codegen_spec(spec: dict, diagram_type: str) -> dict:
     dt = (diagram_type or "").strip().lower()
     if not isinstance(spec, dict):
@@ -1384,8 +2205,7 @@ def _sanitize_codegen_spec(spec: dict, diagram_type: str) -> dict:
 
         wps = payload.get("work_packages")
         if isinstance(wps, list):
-            wp_out = []
-            seen_titles: set[str] = set()
+            wp_out: Dict[str, dict] = {}
             for wp in wps:
                 if not isinstance(wp, dict):
                     continue
@@ -1393,15 +2213,11 @@ def _sanitize_codegen_spec(spec: dict, diagram_type: str) -> dict:
                 bullets = _dedupe_with_global(wp.get("bullets"), max_items=4, max_len=20)
                 if not bullets:
                     bullets = _borrow_summary(max_items=2)
-                key = _normalized_heading_text(title) or _normalized_heading_text(" ".join(bullets))
-                if not key or key in seen_titles:
-                    continue
-                seen_titles.add(key)
-                wp_out.append({"title": title or f"WP{len(wp_out) + 1}", "bullets": bullets})
+                _push_unique(wp_out, _entry_key(title, bullets), {"title": title or f"WP{len(wp_out) + 1}", "bullets": bullets})
                 if len(wp_out) >= 4:
                     break
             if wp_out:
-                out["work_packages"] = wp_out
+                out["work_packages"] = list(wp_out.values())
 
         if not out and summary_points:
             out = {
@@ -1428,8 +2244,7 @@ def _sanitize_codegen_spec(spec: dict, diagram_type: str) -> dict:
                 ]
             }
         return {}
-    stage_out = []
-    seen_titles: set[str] = set()
+    stage_map: Dict[str, dict] = {}
     for stage in stages:
         if not isinstance(stage, dict):
             continue
@@ -1437,14 +2252,11 @@ def _sanitize_codegen_spec(spec: dict, diagram_type: str) -> dict:
         bullets = _dedupe_with_global(stage.get("bullets"), max_items=4, max_len=20)
         if not bullets:
             bullets = _borrow_summary(max_items=2)
-        key = _normalized_heading_text(title) or _normalized_heading_text(" ".join(bullets))
-        if not key or key in seen_titles:
-            continue
-        seen_titles.add(key)
-        stage_out.append({"title": title or f"阶段{len(stage_out) + 1}", "bullets": bullets})
-        if len(stage_out) >= 6:
+        _push_unique(stage_map, _entry_key(title, bullets), {"title": title or f"阶段{len(stage_map) + 1}", "bullets": bullets})
+        if len(stage_map) >= 6:
             break
 
+    stage_out = list(stage_map.values())
     if not stage_out and summary_points:
         stage_out = [
             {"title": "问题定义", "bullets": summary_points[:3]},
@@ -1454,6 +2266,39 @@ def _sanitize_codegen_spec(spec: dict, diagram_type: str) -> dict:
     return {"stages": stage_out} if stage_out else {}
 
 
+_LLM_ACTIVE = 0
+_LLM_COND: Optional[asyncio.Condition] = None
+
+
+@asynccontextmanager
+async def _llm_slot():
+    """Admission slot for outbound LLM calls: at most _LLM_MAX_CONCURRENCY in flight."""
+    global _LLM_ACTIVE, _LLM_COND
+    if _LLM_COND is None:
+        _LLM_COND = asyncio.Condition()
+    cond = _LLM_COND
+    async with cond:
+        try:
+            await cond.wait_for(lambda: _LLM_ACTIVE < _LLM_MAX_CONCURRENCY)
+        except asyncio.CancelledError:
+            # 被唤醒后又被取消时把名额让给下一个等待者，避免通知丢失
+            cond.notify(1)
+            raise
+        _LLM_ACTIVE += 1
+    try:
+        yield
+    finally:
+        # 先减计数（不依赖锁），保证即使此处被取消也不会泄漏名额
+        _LLM_ACTIVE -= 1
+        async with cond:
+            cond.notify(1)
+
+
+async def _writer_chat(workflow, messages: List[dict], **kwargs) -> str:
+    async with _llm_slot():
+        return await workflow.writer_agent._chat(messages, **kwargs)
+
+
 async def _generate_local_infographic_spec_via_skill(
     *,
     workflow,
@@ -1465,12 +2310,8 @@ async def _generate_local_infographic_spec_via_skill(
     registry = get_registry()
     codegen_skill = registry.get("scientific-infographic-codegen")
 
-    full_text = (full_context or "").strip()
-    focus_text = (focus_context or "").strip()
-    if len(full_text) > 12000:
-        full_text = full_text[:12000]
-    if len(focus_text) > 3000:
-        focus_text = focus_text[:3000]
+    full_text = _trim_text(full_context, 12000)
+    focus_text = _trim_text(focus_context, 3000)
 
     schema_hint = _build_codegen_schema_hint(diagram_type)
     fallback_user_prompt = f"""请为科研文稿生成“{title}”的结构化图示规格（用于本地代码渲染，不是成图模型）。
@@ -1540,7 +2381,7 @@ async def _generate_local_infographic_spec_via_skill(
     ]
 
     try:
-        raw = await workflow.writer_agent._chat(messages, temperature=0.2, max_tokens=900)
+        raw = await _writer_chat(workflow, messages, temperature=0.2, max_tokens=900)
         parsed = _extract_json_obj(raw)
         return _sanitize_codegen_spec(parsed, diagram_type)
     except Exception as e:
@@ -1559,52 +2400,92 @@ def _heading_keywords_for_type(diagram_type: str) -> List[str]:
     return ["研究内容", "方法", "框架", "结论"]
 
 
-def _normalized_heading_text(text: str) -> str:
-    s = re.sub(r"^[#\s]+", "", (text or "").strip())
-    s = re.sub(r"[`*_>\-]", "", s)
-    s = re.sub(r"\s+", "", s)
+@lru_cache(maxsize=4096)
+def _normalized_heading_str(text: str) -> str:
+    s = _HEADING_PREFIX_RE.sub("", text.strip())
+    s = _HEADING_MARKUP_RE.sub("", s)
+    s = _WS_RUN_RE.sub("", s)
     return s.lower()
 
 
-def _find_heading_index(lines: List[str], heading: str) -> int:
+def _normalized_heading_text(text: str) -> str:
+    # 同一批 bullet / 标题会被反复归一化去重，结果按字符串缓存
+    return _normalized_heading_str(text if isinstance(text, str) else str(text or ""))
+
+
+def _heading_lines(lines: List[str]) -> List[tuple[int, str]]:
+    """文档中所有 Markdown 标题行：(行号, 归一化文本)；一次插入多张图时只算一遍"""
+    out: List[tuple[int, str]] = []
+    for idx, line in enumerate(lines):
+        s = line.strip()
+        if s.startswith("#"):
+            out.append((idx, _normalized_heading_text(s)))
+    return out
+
+
+@lru_cache(maxsize=16)
+def _heading_keyword_re(diagram_type: str) -> Optional[re.Pattern]:
+    # 关键词集合是固定的：合成一个多模式正则，每个标题只扫描一次
+    keys = [k for k in map(_normalized_heading_text, _heading_keywords_for_type(diagram_type)) if k]
+    if not keys:
+        return None
+    return re.compile("|".join(map(re.escape, keys)))
+
+
+def _find_heading_index(
+    lines: List[str],
+    heading: str,
+    headings: Optional[List[tuple[int, str]]] = None,
+) -> int:
     target = _normalized_heading_text(heading)
     if not target:
         return -1
-    for idx, line in enumerate(lines):
-        s = line.strip()
-        if not s.startswith("#"):
-            continue
-        h = _normalized_heading_text(s)
+    for idx, h in (_heading_lines(lines) if headings is None else headings):
         if target in h or h in target:
             return idx
     return -1
 
 
-def _find_line_index_by_anchor(lines: List[str], anchor_text: str) -> int:
+def _line_offsets(lines: List[str]) -> tuple[str, List[int]]:
+    """整篇文本 + 每行起始偏移；多个锚点共用，一次 find + 二分定位行号"""
+    starts: List[int] = []
+    pos = 0
+    for line in lines:
+        starts.append(pos)
+        pos += len(line) + 1
+    return "\n".join(lines), starts
+
+
+def _find_line_index_by_anchor(
+    lines: List[str],
+    anchor_text: str,
+    offsets: Optional[tuple[str, List[int]]] = None,
+) -> int:
     anchor = (anchor_text or "").strip()
-    if not anchor:
+    # 锚点跨行时不可能落在单行内
+    if not anchor or "\n" in anchor:
         return -1
-    for idx, line in enumerate(lines):
-        if anchor in line:
-            return idx
-    return -1
+    joined, starts = _line_offsets(lines) if offsets is None else offsets
+    pos = joined.find(anchor)
+    if pos < 0:
+        return -1
+    return bisect.bisect_right(starts, pos) - 1
 
 
-def _fallback_insert_index(lines: List[str], diagram_type: str) -> int:
-    keys = _heading_keywords_for_type(diagram_type)
-    for idx, line in enumerate(lines):
-        s = line.strip()
-        if not s.startswith("#"):
-            continue
-        normalized = _normalized_heading_text(s)
-        for key in keys:
-            if _normalized_heading_text(key) in normalized:
+def _fallback_insert_index(
+    lines: List[str],
+    diagram_type: str,
+    headings: Optional[List[tuple[int, str]]] = None,
+) -> int:
+    if headings is None:
+        headings = _heading_lines(lines)
+    pattern = _heading_keyword_re((diagram_type or "").strip().lower())
+    if pattern is not None:
+        for idx, normalized in headings:
+            if pattern.search(normalized):
                 return idx
 
-    for idx, line in enumerate(lines):
-        if line.strip().startswith("#"):
-            return idx
-    return 0
+    return headings[0][0] if headings else 0
 
 
 async def _plan_illustration_items(
@@ -1615,9 +2496,7 @@ async def _plan_illustration_items(
     agent_system_prompt: str = "",
 ) -> List[Dict[str, str]]:
     max_images = max(1, min(int(max_images or 2), 4))
-    excerpt = (document_content or "").strip()
-    if len(excerpt) > 12000:
-        excerpt = excerpt[:12000]
+    excerpt = _trim_text(document_content, 12000)
 
     prompt = f"""你是科研文档配图规划助手。请根据全文内容，规划最多 {max_images} 张图。
 
@@ -1627,7 +2506,8 @@ async def _plan_illustration_items(
     {{
       "title": "图标题",
       "diagram_type": "technical_route|research_framework|infographic",
-      "focus_text": "从全文中挑出的关键内容摘要（1-3句）"
+      "focus_text": "从全文中挑出的关键内容摘要（1-3句）",
+      "anchor_heading": "该图应插入在其后的章节标题（照抄全文中已有的 Markdown 标题文字）"
     }}
   ]
 }}
@@ -1636,7 +2516,8 @@ async def _plan_illustration_items(
 1) 标题简洁专业；
 2) 优先覆盖“技术路线图、研究框架图”；
 3) focus_text 必须来自全文语义，不编造事实；
-4) 仅输出 JSON。
+4) anchor_heading 必须是全文中真实存在的标题，让图片贴近对应章节，避免全部堆在文档开头；
+5) 仅输出 JSON。
 
 全文：
 {excerpt}
@@ -1649,7 +2530,7 @@ async def _plan_illustration_items(
         {"role": "user", "content": prompt},
     ]
     try:
-        raw = await workflow.writer_agent._chat(messages, temperature=0.2, max_tokens=700)
+        raw = await _writer_chat(workflow, messages, temperature=0.2, max_tokens=700)
         obj = _extract_json_obj(raw)
     except Exception:
         obj = {}
@@ -1673,6 +2554,7 @@ async def _plan_illustration_items(
                 "title": title[:40],
                 "diagram_type": dtype,
                 "focus_text": focus_text[:3000],
+                "anchor_heading": str(it.get("anchor_heading") or "").strip()[:80],
             })
             if len(normalized) >= max_images:
                 break
@@ -1687,6 +2569,19 @@ async def _plan_illustration_items(
     return fallback[:max_images]
 
 
+def _placements_from_plan(document_content: str, diagrams: List[Dict[str, Any]]) -> Optional[List[Dict[str, str]]]:
+    """规划阶段已给出的 anchor_heading 全部能在文档中命中时，直接得到插入位置；否则返回 None"""
+    lines = document_content.split("\n")
+    headings = _heading_lines(lines)
+    out: List[Dict[str, str]] = []
+    for d in diagrams:
+        anchor = str(d.get("anchor_heading") or "").strip()
+        if not anchor or _find_heading_index(lines, anchor, headings) < 0:
+            return None
+        out.append({"diagram_id": str(d.get("diagram_id") or ""), "anchor_heading": anchor, "anchor_text": ""})
+    return out
+
+
 async def _plan_insertions_with_llm(
     *,
     workflow,
@@ -1694,9 +2589,7 @@ async def _plan_insertions_with_llm(
     diagrams: List[Dict[str, Any]],
     agent_system_prompt: str = "",
 ) -> List[Dict[str, str]]:
-    excerpt = (document_content or "").strip()
-    if len(excerpt) > 14000:
-        excerpt = excerpt[:14000]
+    excerpt = _trim_text(document_content, 14000)
 
     diag_lines = []
     for d in diagrams:
@@ -1738,7 +2631,7 @@ async def _plan_insertions_with_llm(
         {"role": "user", "content": prompt},
     ]
     try:
-        raw = await workflow.writer_agent._chat(messages, temperature=0.1, max_tokens=700)
+        raw = await _writer_chat(workflow, messages, temperature=0.1, max_tokens=700)
         obj = _extract_json_obj(raw)
     except Exception:
         obj = {}
@@ -1769,47 +2662,75 @@ def _apply_diagram_insertions(
     text = _normalize_markdown_text(document_content or "")
     lines = text.split("\n")
 
-    placement_map = {str(p.get("diagram_id") or "").strip(): p for p in placements if isinstance(p, dict)}
+    # 预处理一次：diagram_id -> (anchor_heading, anchor_text)
+    placement_map: Dict[str, tuple[str, str]] = {}
+    for p in placements:
+        if isinstance(p, dict):
+            placement_map[str(p.get("diagram_id") or "").strip()] = (
+                str(p.get("anchor_heading") or "").strip(),
+                str(p.get("anchor_text") or "").strip(),
+            )
 
-    indexed_blocks: List[tuple[int, int, str]] = []
-    for order, d in enumerate(diagrams):
+    headings = _heading_lines(lines)
+    offsets: Optional[tuple[str, List[int]]] = None
+    buckets: Dict[int, List[List[str]]] = {}
+    for d in diagrams:
         did = str(d.get("diagram_id") or "").strip()
         if not did:
             continue
-        placement = placement_map.get(did, {})
+        anchor_heading, anchor_text = placement_map.get(did, ("", ""))
         idx = -1
-        anchor_heading = str(placement.get("anchor_heading") or "").strip()
         if anchor_heading:
-            idx = _find_heading_index(lines, anchor_heading)
+            idx = _find_heading_index(lines, anchor_heading, headings)
+        if idx < 0 and anchor_text:
+            if offsets is None:
+                offsets = _line_offsets(lines)
+            idx = _find_line_index_by_anchor(lines, anchor_text, offsets)
         if idx < 0:
-            anchor_text = str(placement.get("anchor_text") or "").strip()
-            if anchor_text:
-                idx = _find_line_index_by_anchor(lines, anchor_text)
-        if idx < 0:
-            idx = _fallback_insert_index(lines, str(d.get("diagram_type") or ""))
+            idx = _fallback_insert_index(lines, str(d.get("diagram_type") or ""), headings)
 
         snippet = str(d.get("markdown_snippet") or "").strip()
         if not snippet:
             continue
-        block_lines = ["", snippet, ""]
-        block = "\n".join(block_lines)
-        indexed_blocks.append((idx, order, block))
-
-    # Desc insert to keep indices stable
-    indexed_blocks.sort(key=lambda x: (x[0], x[1]), reverse=True)
-    for idx, _order, block in indexed_blocks:
+        # 插在锚点行之后；同一位置按 diagrams 原顺序排列
         insert_at = max(0, min(idx + 1, len(lines)))
-        b_lines = block.split("\n")
-        lines[insert_at:insert_at] = b_lines
+        buckets.setdefault(insert_at, []).append(["", *snippet.split("\n"), ""])
 
-    return _normalize_markdown_text("\n".join(lines))
+    # 单遍拼接：按插入点顺序整段拷贝原文行，Python 层循环次数只与插图数量相关
+    out: List[str] = []
+    prev = 0
+    for at in sorted(buckets):
+        out.extend(lines[prev:at])
+        for block_lines in buckets[at]:
+            out.extend(block_lines)
+        prev = at
+    out.extend(lines[prev:])
+
+    return _normalize_markdown_text("\n".join(out))
 
 
 @router.post("/session/{session_id}/generate-diagram")
 async def generate_diagram(session_id: str, request: DiagramRequest):
     """生成图示：`image_model` 走成图模型；`infographic` 走本地信息图渲染（无外部成图依赖）。"""
+    result, _ = await _create_diagram(session_id, request)
+    return result
+
+
+async def _create_diagram(
+    session_id: str,
+    request: DiagramRequest,
+    session: Any = None,
+    defer_save: bool = False,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    generate-diagram 主链路，返回 (响应体, diagram_record)。
+
+    调用方已持有会话时可传入 `session` 省去一次读取；`defer_save=True` 时不写回会话，
+    由调用方汇总多条 diagram_record 后统一保存一次（自动配图）。
+    """
     workflow = get_workflow()
-    session = workflow.get_session(session_id)
+    if session is None:
+        session = workflow.get_session(session_id)
     if not session:
         raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
 
@@ -1849,36 +2770,46 @@ async def generate_diagram(session_id: str, request: DiagramRequest):
     if request.selected_text:
         selected_text = (request.selected_text or "").strip()
         requirements_text = selected_text or "（暂无）"
-        external_excerpt = (request.context_text or "").strip()
-        if len(external_excerpt) > 12000:
-            external_excerpt = external_excerpt[:12000]
+        external_excerpt = _trim_text(request.context_text, 12000)
     else:
         requirements = session.requirements or {}
-        req_lines = []
-        for f in skill.requirement_fields:
-            v = requirements.get(f.id)
-            if v is None:
-                continue
-            if isinstance(v, str) and not v.strip():
-                continue
-            req_lines.append(f"- {f.name}({f.id}): {v}")
+        _get = requirements.get
+        req_lines = [
+            f"- {f.name}({f.id}): {v}"
+            for f in skill.requirement_fields
+            if (v := _get(f.id)) is not None and not (isinstance(v, str) and not v.strip())
+        ]
         requirements_text = "\n".join(req_lines) if req_lines else "（暂无）"
-        external_excerpt = (session.external_information or "").strip()
-        if len(external_excerpt) > 2500:
-            external_excerpt = external_excerpt[:2500]
+        external_excerpt = _trim_text(session.external_information, 2500)
 
     raw_spec = {}
     full_context_for_codegen = (request.context_text or external_excerpt or "").strip()
     focus_context_for_codegen = (request.selected_text or requirements_text or "").strip()
 
+    infographic_key: Optional[bytes] = None
+    cached_assets: Optional[tuple] = None
     if mode == "infographic":
-        raw_spec = await _generate_local_infographic_spec_via_skill(
-            workflow=workflow,
-            diagram_type=diagram_type,
-            title=title,
-            full_context=full_context_for_codegen,
-            focus_context=focus_context_for_codegen,
+        # 输入完全相同（重试 / 重新生成）时直接复用上次的规格与渲染结果，跳过 LLM 与本地渲染
+        infographic_key = _infographic_cache_key(
+            diagram_type,
+            title,
+            full_context_for_codegen,
+            focus_context_for_codegen,
+            request.selected_text or "",
+            requirements_text,
+            str(id(registry.get("scientific-infographic-codegen"))),
         )
+        cached_assets = _INFOGRAPHIC_CACHE.get(infographic_key)
+        if cached_assets is not None:
+            raw_spec = cached_assets[0]
+        else:
+            raw_spec = await _generate_local_infographic_spec_via_skill(
+                workflow=workflow,
+                diagram_type=diagram_type,
+                title=title,
+                full_context=full_context_for_codegen,
+                focus_context=focus_context_for_codegen,
+            )
     elif diagram_type in {"technical_route", "research_framework"}:
         if diagram_type == "technical_route":
             json_schema_hint = """{
@@ -1931,7 +2862,7 @@ JSON 结构示例：
             {"role": "user", "content": prompt},
         ]
         try:
-            spec_text = await workflow.writer_agent._chat(messages, temperature=0.2, max_tokens=900)
+            spec_text = await _writer_chat(workflow, messages, temperature=0.2, max_tokens=900)
             raw_spec = _extract_json_obj(spec_text)
         except Exception as e:
             logger.warning("diagram spec generation failed: %s", _redact_secrets(str(e))[:240])
@@ -1975,7 +2906,8 @@ JSON 结构示例：
             return "\n".join(parts) if parts else requirements_text
 
         source = ((request.selected_text or "").strip() or requirements_text or "").strip()
-        pieces = [x.strip("•- \t") for x in re.split(r"[\n；;]+", source) if x and x.strip("•- \t")]
+        # 每段只 strip 一次（原写法在过滤和取值时各 strip 一遍）
+        pieces = [p for p in (x.strip(_POINT_STRIP_CHARS) for x in _POINT_SPLIT_RE.split(source)) if p]
         if not pieces:
             return "1. 研究目标与问题定义\n2. 方法与技术路径\n3. 验证与成果输出"
         return "\n".join([f"{i + 1}. {v}" for i, v in enumerate(pieces[:10])])
@@ -2041,12 +2973,18 @@ JSON 结构示例：
 
     if mode == "infographic":
         try:
-            png_bytes, svg_text, used_spec, render_type = _render_local_infographic_assets(
-                diagram_type=diagram_type,
-                raw_spec=raw_spec,
-                lines_text=lines_text,
-                title=title,
-            )
+            if cached_assets is not None:
+                _spec, png_bytes, svg_text, used_spec, render_type = cached_assets
+            else:
+                png_bytes, svg_text, used_spec, render_type = await _render_local_infographic_assets(
+                    diagram_type=diagram_type,
+                    raw_spec=raw_spec,
+                    lines_text=lines_text,
+                    title=title,
+                )
+                # LLM 失败（空规格）时不缓存，下次仍会重新规划
+                if raw_spec and infographic_key is not None:
+                    _INFOGRAPHIC_CACHE.put(infographic_key, (raw_spec, png_bytes, svg_text, used_spec, render_type))
             review_result = {
                 "passed": True,
                 "score": 95,
@@ -2057,26 +2995,24 @@ JSON 结构示例：
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"本地信息图生成失败：{_redact_secrets(str(e))}")
     else:
-        from backend.core.diagrams.openai_images import (
-            generate_image_png_via_openai_compatible,
-            review_image_via_openai_compatible,
-        )
+        async def _generate_at(prompt_text: str, size: str) -> bytes:
+            png, _raw = await generate_image_png_via_openai_compatible(
+                base_url=cfg.base_url,
+                api_key=cfg.api_key,
+                model=image_model,
+                prompt=prompt_text,
+                size=size,
+            )
+            return png
 
         async def _generate_image(prompt_text: str) -> bytes:
+            # 依次尝试：只有首选尺寸出错时才请求下一个，避免每张图都多生成（并计费）一次
             last_err = None
-            for size in ("1792x1024", "1024x1024"):
+            for size in _IMAGE_SIZES:
                 try:
-                    png, _raw = await generate_image_png_via_openai_compatible(
-                        base_url=cfg.base_url,
-                        api_key=cfg.api_key,
-                        model=image_model,
-                        prompt=prompt_text,
-                        size=size,
-                    )
-                    return png
+                    return await _generate_at(prompt_text, size)
                 except Exception as e:
                     last_err = e
-                    continue
             if last_err is None:
                 raise RuntimeError("成图模型未返回图像")
             raise last_err
@@ -2098,7 +3034,7 @@ JSON 结构示例：
             gen_error = _redact_secrets(str(e))
             logger.warning("image model generation failed, fallback to local infographic: %s", gen_error[:320])
             try:
-                png_bytes, svg_text, used_spec, render_type = _render_local_infographic_assets(
+                png_bytes, svg_text, used_spec, render_type = await _render_local_infographic_assets(
                     diagram_type=diagram_type,
                     raw_spec=raw_spec,
                     lines_text=lines_text,
@@ -2146,30 +3082,29 @@ JSON 结构示例：
                 except Exception as e:
                     logger.warning("diagram retry generation failed: %s", _redact_secrets(str(e))[:260])
 
-    diagram_id = str(uuid.uuid4())
-    png_path, svg_path = _diagram_paths(session_id, diagram_id)
+    # 按内容寻址：同一会话内重复生成完全相同的图会复用同一 id 与文件
+    diagram_id = _diagram_content_id(png_bytes, title)
+    png_path, svg_path = _diagram_paths(session_id, diagram_id, create=True)
 
     try:
-        png_path.write_bytes(png_bytes)
-        if svg_text:
-            svg_path.write_text(svg_text, encoding="utf-8")
+        # 图片可达数 MB，写盘放到线程池，不阻塞事件循环
+        await asyncio.to_thread(_write_diagram_assets, png_path, png_bytes, svg_path, svg_text)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"保存图示失败：{_redact_secrets(str(e))}")
 
-    b64_png = base64.b64encode(png_bytes).decode("ascii")
+    b64_png = _b64.b64encode(png_bytes).decode("ascii")
     data_uri = f"data:image/png;base64,{b64_png}"
     snippet = _build_figure_markdown(title, data_uri)
 
-    diagram_record = {
-        "id": diagram_id,
-        "title": title,
-        "diagram_type": diagram_type,
-        "mode": actual_mode,
-        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
-        "has_png": True,
-        "has_svg": bool(svg_text),
-        "spec": used_spec or None,
-        "meta": {
+    diagram_record = DiagramRecord(
+        id=diagram_id,
+        title=title,
+        diagram_type=diagram_type,
+        mode=actual_mode,
+        has_png=True,
+        has_svg=bool(svg_text),
+        spec=used_spec or None,
+        meta={
             "provider": getattr(cfg, "provider_name", None),
             "chat_model": getattr(cfg, "model", None),
             "image_model": image_model or None,
@@ -2178,9 +3113,9 @@ JSON 结构示例：
             "review": review_result,
             "review_error": review_error,
         },
-    }
-    session.diagrams = (session.diagrams or []) + [diagram_record]
-    workflow.save_session(session)
+    ).to_dict()
+    if not defer_save:
+        await _append_diagram_records(workflow, session_id, session, [diagram_record])
 
     return {
         "success": True,
@@ -2189,14 +3124,44 @@ JSON 结构示例：
         "title": title,
         "diagram_type": diagram_type,
         "mode": actual_mode,
-        "image_data_uri": data_uri,
+        "image_data_uri": data_uri if request.inline else None,
         "markdown_snippet": snippet,
         "has_svg": bool(svg_text),
         "png_url": f"/api/chat/session/{session_id}/diagrams/{diagram_id}.png",
         "svg_url": f"/api/chat/session/{session_id}/diagrams/{diagram_id}.svg" if svg_text else None,
         "review": review_result,
         "review_error": review_error,
-    }
+    }, diagram_record
+
+
+async def _append_diagram_records(workflow, session_id: str, session: Any, records: List[Dict[str, Any]]) -> None:
+    """把新图示记录追加到会话并保存一次（合并写入前重新读取最新会话，避免并发请求互相覆盖）"""
+    if not records:
+        return
+    async with _upload_slot(session_id):
+        latest_session = workflow.get_session(session_id) or session
+        existing = latest_session.diagrams or []
+        # 内容寻址的 id 可能与已有记录相同（重复生成同一张图）：不重复追加，但把原记录挪到末尾，
+        # 让它算作最新生成，免得随后被上限淘汰、刚返回给前端的 png_url 随即失效
+        by_id = {d.get("id"): d for d in existing if isinstance(d, dict)}
+        tail: List[Any] = []
+        tail_ids: set = set()
+        for r in records:
+            if r["id"] not in tail_ids:
+                tail_ids.add(r["id"])
+                tail.append(by_id.get(r["id"], r))
+        merged = [d for d in existing if not (isinstance(d, dict) and d.get("id") in tail_ids)] + tail
+        if merged == existing:
+            return
+        evicted: List[Any] = []
+        if _SESSION_DIAGRAMS_MAX and len(merged) > _SESSION_DIAGRAMS_MAX:
+            evicted = merged[:-_SESSION_DIAGRAMS_MAX]
+            merged = merged[-_SESSION_DIAGRAMS_MAX:]
+        latest_session.diagrams = merged
+        workflow.save_session(latest_session)
+    if evicted:
+        # 文档中的图片以 data URI 内嵌，淘汰记录后其 PNG/SVG 文件不再被引用
+        await asyncio.to_thread(_remove_diagram_assets, session_id, evicted)
 
 
 @router.post("/session/{session_id}/generate-illustrations")
@@ -2205,7 +3170,7 @@ async def generate_illustrations(session_id: str, request: GenerateIllustrations
     文章配图 Agent：
     1) 基于全文规划要生成的图；
     2) 生成并审核图；
-    3) 最后再调用一次 LLM 规划插入位置并完成插入。
+    3) 按规划时给出的标题锚点插入（锚点缺失或不匹配时再调用一次 LLM 规划插入位置）。
     """
     workflow = get_workflow()
     session = workflow.get_session(session_id)
@@ -2216,7 +3181,8 @@ async def generate_illustrations(session_id: str, request: GenerateIllustrations
 
     _ensure_llm_configured()
 
-    document_content = _normalize_markdown_text(request.document_content or "")
+    # 整篇文档的逐行处理是纯 CPU 工作，放到线程池，避免阻塞事件循环
+    document_content = await asyncio.to_thread(_normalize_markdown_text, request.document_content or "")
     if len(document_content.strip()) < 30:
         raise HTTPException(status_code=400, detail="文章内容过短，无法自动配图。")
 
@@ -2231,8 +3197,7 @@ async def generate_illustrations(session_id: str, request: GenerateIllustrations
     registry = get_registry()
     schematics_skill = registry.get("scientific-schematics")
     agent_system_prompt = _resolve_skill_system_prompt(schematics_skill)
-    if len(agent_system_prompt) > 4000:
-        agent_system_prompt = agent_system_prompt[:4000]
+    agent_system_prompt = agent_system_prompt[:4000]
 
     # Step 1) 先基于全文规划配图任务
     items = await _plan_illustration_items(
@@ -2242,11 +3207,15 @@ async def generate_illustrations(session_id: str, request: GenerateIllustrations
         agent_system_prompt=agent_system_prompt,
     )
 
-    # Step 2) 逐图生成（仍复用 generate-diagram 主链路，selected_text 为核心，context_text 为全文）
-    created: List[Dict[str, Any]] = []
-    for item in items:
-        try:
-            result = await generate_diagram(
+    # Step 2) 并发生成各图（仍复用 generate-diagram 主链路，selected_text 为核心，context_text 为全文）
+    sem = asyncio.Semaphore(_ILLUSTRATION_CONCURRENCY)
+
+    # 各图复用已读取的会话且不单独保存，全部生成后统一写回一次
+    records: List[Dict[str, Any]] = []
+
+    async def _one(item: Dict[str, str]) -> Dict[str, Any]:
+        async with sem:
+            result, record = await _create_diagram(
                 session_id=session_id,
                 request=DiagramRequest(
                     title=item.get("title") or None,
@@ -2255,33 +3224,48 @@ async def generate_illustrations(session_id: str, request: GenerateIllustrations
                     selected_text=(item.get("focus_text") or "").strip() or document_content[:1600],
                     context_text=document_content,
                 ),
+                session=session,
+                defer_save=True,
             )
-            created.append({
-                "diagram_id": result.get("diagram_id"),
-                "title": result.get("title"),
-                "diagram_type": result.get("diagram_type"),
-                "markdown_snippet": result.get("markdown_snippet"),
-                "focus_text": item.get("focus_text") or "",
-                "review": result.get("review"),
-                "review_error": result.get("review_error"),
-            })
-        except Exception as e:
-            logger.warning("auto illustration generate failed: %s", _redact_secrets(str(e))[:260])
+        records.append(record)
+        return {
+            "diagram_id": result.get("diagram_id"),
+            "title": result.get("title"),
+            "diagram_type": result.get("diagram_type"),
+            "markdown_snippet": result.get("markdown_snippet"),
+            "focus_text": item.get("focus_text") or "",
+            "anchor_heading": item.get("anchor_heading") or "",
+            "review": result.get("review"),
+            "review_error": result.get("review_error"),
+        }
+
+    created: List[Dict[str, Any]] = []
+    for outcome in await asyncio.gather(*(_one(item) for item in items), return_exceptions=True):
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, Exception):
+                raise outcome
+            logger.warning("auto illustration generate failed: %s", _redact_secrets(str(outcome))[:260])
             continue
+        created.append(outcome)
+
+    await _append_diagram_records(workflow, session_id, session, records)
 
     if not created:
         raise HTTPException(status_code=502, detail="自动配图失败：未生成任何图片。")
 
-    # Step 3) 最后一轮 LLM：决定插图位置
-    placements = await _plan_insertions_with_llm(
-        workflow=workflow,
-        document_content=document_content,
-        diagrams=created,
-        agent_system_prompt=agent_system_prompt,
-    )
+    # Step 3) 插图位置：规划阶段给出的标题锚点都能命中时直接使用，否则再调用一轮 LLM 规划
+    placements = _placements_from_plan(document_content, created)
+    if placements is None:
+        placements = await _plan_insertions_with_llm(
+            workflow=workflow,
+            document_content=document_content,
+            diagrams=created,
+            agent_system_prompt=agent_system_prompt,
+        )
 
     # Step 4) 插入并优化排版
-    updated_document = _apply_diagram_insertions(
+    updated_document = await asyncio.to_thread(
+        _apply_diagram_insertions,
         document_content=document_content,
         diagrams=created,
         placements=placements,
@@ -2306,25 +3290,10 @@ async def list_diagrams(session_id: str):
     if not session:
         raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
 
-    diagrams = session.diagrams or []
-    return {
+    return _json_response({
         "session_id": session_id,
-        "diagrams": [
-            {
-                "id": d.get("id"),
-                "title": d.get("title"),
-                "diagram_type": d.get("diagram_type"),
-                "mode": d.get("mode") or ("infographic" if d.get("svg") else "unknown"),
-                "created_at": d.get("created_at"),
-                "has_png": (flags := _diagram_asset_flags(session_id, d))[0],
-                "has_svg": flags[1],
-                "png_url": f"/api/chat/session/{session_id}/diagrams/{d.get('id')}.png" if flags[0] else None,
-                "svg_url": f"/api/chat/session/{session_id}/diagrams/{d.get('id')}.svg" if flags[1] else None,
-            }
-            for d in diagrams
-            if isinstance(d, dict)
-        ],
-    }
+        "diagrams": await _diagram_summaries_async(session_id, session.diagrams),
+    })
 
 
 @router.get("/session/{session_id}/diagrams/{diagram_id}.svg")
@@ -2342,20 +3311,20 @@ async def get_diagram_svg(session_id: str, diagram_id: str):
     # New format: file-based SVG
     _png_path, svg_path = _diagram_paths(session_id, diagram_id)
     if svg_path.exists():
-        svg = svg_path.read_text(encoding="utf-8", errors="ignore")
-        filename = _safe_filename(diagram.get("title") or "diagram", "svg")
-        return StreamingResponse(
-            iter([svg.encode("utf-8")]),
+        # FileResponse 在线程池中分块读文件，不阻塞事件循环
+        return FileResponse(
+            svg_path,
             media_type="image/svg+xml",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+            filename=_safe_filename(diagram.get("title") or "diagram", "svg"),
         )
 
     # Backward compatibility: stored inline SVG string (older mermaid-based diagrams)
     svg_inline = (diagram.get("svg") or "").strip()
     if svg_inline:
         filename = _safe_filename(diagram.get("title") or "diagram", "svg")
-        return StreamingResponse(
-            iter([svg_inline.encode("utf-8")]),
+        # 内容已在内存中，直接用普通 Response（带 Content-Length），无需分块传输
+        return Response(
+            content=svg_inline.encode("utf-8"),
             media_type="image/svg+xml",
             headers={"Content-Disposition": f'attachment; filename="{filename}"'},
         )
@@ -2379,17 +3348,17 @@ async def get_diagram_png(session_id: str, diagram_id: str):
     if not png_path.exists():
         raise HTTPException(status_code=404, detail="PNG 不存在")
 
-    raw = png_path.read_bytes()
-    filename = _safe_filename(diagram.get("title") or "diagram", "png")
-    return StreamingResponse(
-        iter([raw]),
+    return FileResponse(
+        png_path,
         media_type="image/png",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        filename=_safe_filename(diagram.get("title") or "diagram", "png"),
     )
 
 
 class UpdateRequirementsRequest(BaseModel):
     """更新需求请求"""
+    model_config = _API_MODEL_CONFIG
+
     requirements: dict
 
 
@@ -2402,27 +3371,30 @@ async def update_requirements(session_id: str, request: UpdateRequirementsReques
     - 不需要通过对话收集
     """
     workflow = get_workflow()
-    session = workflow.get_session(session_id)
 
-    if not session:
-        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    # 与上传合并共用会话锁：读-改-写期间不允许其他请求覆盖 requirements
+    async with _upload_slot(session_id):
+        session = workflow.get_session(session_id)
 
-    # 更新需求
-    if session.requirements is None:
-        session.requirements = {}
+        if not session:
+            raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
 
-    # 合并新的需求（保留已有值，除非明确覆盖）
-    for key, value in request.requirements.items():
-        if value is None:
-            session.requirements.pop(key, None)
-            continue
-        if isinstance(value, str) and not value.strip():
-            session.requirements.pop(key, None)
-            continue
-        session.requirements[key] = value
+        # 更新需求
+        if session.requirements is None:
+            session.requirements = {}
 
-    # 保存会话
-    workflow.save_session(session)
+        # 合并新的需求（保留已有值，除非明确覆盖）
+        for key, value in request.requirements.items():
+            if value is None:
+                session.requirements.pop(key, None)
+                continue
+            if isinstance(value, str) and not value.strip():
+                session.requirements.pop(key, None)
+                continue
+            session.requirements[key] = value
+
+        # 保存会话
+        workflow.save_session(session)
 
     return {
         "success": True,
@@ -2472,7 +3444,7 @@ async def get_requirements(session_id: str):
                 if field.get("collection") == "required":
                     field["collection"] = "optional"
 
-    return {
+    return _json_response({
         "session_id": session_id,
         "phase": session.phase,
         "is_complete": session.phase == "complete",
@@ -2482,22 +3454,8 @@ async def get_requirements(session_id: str):
         "external_information": session.external_information,
         "skill_overlay": session.skill_overlay,
         "planner_plan": session.planner_plan,
-        "diagrams": [
-            {
-                "id": d.get("id"),
-                "title": d.get("title"),
-                "diagram_type": d.get("diagram_type"),
-                "mode": d.get("mode") or ("infographic" if d.get("svg") else "unknown"),
-                "created_at": d.get("created_at"),
-                "has_png": (flags := _diagram_asset_flags(session_id, d))[0],
-                "has_svg": flags[1],
-                "png_url": f"/api/chat/session/{session_id}/diagrams/{d.get('id')}.png" if flags[0] else None,
-                "svg_url": f"/api/chat/session/{session_id}/diagrams/{d.get('id')}.svg" if flags[1] else None,
-            }
-            for d in (session.diagrams or [])
-            if isinstance(d, dict)
-        ],
-    }
+        "diagrams": await _diagram_summaries_async(session_id, session.diagrams),
+    })
 
 
 @router.get("/session/{session_id}/plan")
@@ -2509,7 +3467,7 @@ async def get_planner_plan(session_id: str):
         raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
     if not session.planner_plan:
         raise HTTPException(status_code=404, detail="Planner 蓝图尚未生成")
-    return {"session_id": session_id, "planner_plan": session.planner_plan}
+    return _json_response({"session_id": session_id, "planner_plan": session.planner_plan})
 
 
 @router.post("/session/{session_id}/start-generation")
@@ -2540,11 +3498,19 @@ async def start_generation(session_id: str):
     requirements = session.requirements or {}
 
     if not (session.skill_overlay and session.skill_overlay.get("relax_requirements")):
-        for field in skill.requirement_fields:
-            if field.required:
-                value = requirements.get(field.id)
-                if not value or (isinstance(value, str) and not value.strip()):
-                    missing_fields.append(field.name)
+        required_ids = getattr(skill, "_required_field_ids", None)
+        required_names = getattr(skill, "_required_field_names", None)
+        if required_ids is None or required_names is None:
+            required_fields = [f for f in skill.requirement_fields if f.required]
+            required_ids = frozenset(f.id for f in required_fields)
+            required_names = {f.id: f.name for f in required_fields}
+        filled_ids = {
+            k for k, v in requirements.items()
+            if v and (not isinstance(v, str) or v.strip())
+        }
+        missing_ids = required_ids - filled_ids
+        # 按 Skill 中的字段定义顺序输出缺失字段名
+        missing_fields = [name for fid, name in required_names.items() if fid in missing_ids]
 
     if missing_fields:
         # 前端已去除“必填字段”表单展示，因此这里改为“软校验”：
@@ -12,11 +12,13 @@ import io
 import re
 import base64
 import tempfile
+import logging
 import httpx
 
 from backend.models.database import get_database, Document as DocumentModel
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 db = get_database()
 
 
@@ -670,9 +672,7 @@ async def export_content(request: ExportRequest):
                 detail="PDF export requires fpdf2. Run: pip install fpdf2"
             )
         except Exception as e:
-            import traceback
-            error_detail = f"PDF generation failed: {str(e)}\n{traceback.format_exc()}"
-            print(f"[PDF Export Error] {error_detail}")
+            logger.exception("[PDF Export Error]")
             raise HTTPException(
                 status_code=500,
                 detail=f"PDF generation failed: {str(e)}"
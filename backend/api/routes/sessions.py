@@ -8,6 +8,7 @@ from pydantic import BaseModel
 from datetime import datetime
 
 from backend.models.session_store import DatabaseSessionStore
+from backend.api.responses import json_response as _json_response
 
 router = APIRouter()
 store = DatabaseSessionStore()
@@ -36,7 +37,8 @@ class SessionDetail(BaseModel):
     updated_at: str
 
 
-@router.get("/", response_model=List[SessionSummary])
+# response_model=None：模型只用于 OpenAPI 文档，返回值不再逐条构造/校验
+@router.get("/", response_model=None, responses={200: {"model": List[SessionSummary]}})
 async def list_sessions(
     skill_id: Optional[str] = None,
     limit: int = 50
@@ -52,37 +54,37 @@ async def list_sessions(
     else:
         sessions = store.list_all(limit=limit)
 
-    return [
-        SessionSummary(
-            session_id=s.session_id,
-            skill_id=s.skill_id,
-            phase=s.phase,
-            message_count=len(s.messages) if s.messages else 0,
-            has_document=s.final_document is not None,
-            created_at=s.created_at,
-            updated_at=s.updated_at,
-        )
+    return _json_response([
+        {
+            "session_id": s.session_id,
+            "skill_id": s.skill_id,
+            "phase": s.phase,
+            "message_count": len(s.messages) if s.messages else 0,
+            "has_document": s.final_document is not None,
+            "created_at": s.created_at,
+            "updated_at": s.updated_at,
+        }
         for s in sessions
-    ]
+    ])
 
 
-@router.get("/{session_id}", response_model=SessionDetail)
+@router.get("/{session_id}", response_model=None, responses={200: {"model": SessionDetail}})
 async def get_session(session_id: str):
     """获取会话详情"""
     session = store.get(session_id)
     if not session:
         raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
 
-    return SessionDetail(
-        session_id=session.session_id,
-        skill_id=session.skill_id,
-        phase=session.phase,
-        messages=session.messages,
-        sections=session.sections,
-        final_document=session.final_document,
-        created_at=session.created_at,
-        updated_at=session.updated_at,
-    )
+    return _json_response({
+        "session_id": session.session_id,
+        "skill_id": session.skill_id,
+        "phase": session.phase,
+        "messages": session.messages,
+        "sections": session.sections,
+        "final_document": session.final_document,
+        "created_at": session.created_at,
+        "updated_at": session.updated_at,
+    })
 
 
 @router.delete("/{session_id}")
@@ -106,9 +108,9 @@ async def get_session_document(session_id: str):
     if not session.final_document:
         raise HTTPException(status_code=404, detail="Document not generated yet")
 
-    return {
+    return _json_response({
         "session_id": session_id,
         "skill_id": session.skill_id,
         "document": session.final_document,
         "sections": session.sections,
-    }
+    })
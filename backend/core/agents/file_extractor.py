@@ -8,7 +8,7 @@ import logging
 import os
 
 from backend.core.llm.gateway import get_global_gateway
-from backend.core.skills.template_parser import parse_template_file
+from backend.core.skills.template_parser import FileContent, parse_template_file
 
 logger = logging.getLogger(__name__)
 _FILE_EXTRACTION_CONCURRENCY = max(1, min(int(os.getenv("FILE_EXTRACTION_CONCURRENCY", "4")), 12))
@@ -357,21 +357,31 @@ async def extract_info_from_multiple_files(
             return idx, filename, {}
 
         async with sem:
-            result = await extract_info_from_file(
-                file_content=content,
-                filename=filename,
-                skill_fields=skill_fields,
-                skill_name=skill_name,
-                existing_requirements=existing_requirements,
-            )
+            try:
+                result = await extract_info_from_file(
+                    file_content=content,
+                    filename=filename,
+                    skill_fields=skill_fields,
+                    skill_name=skill_name,
+                    existing_requirements=existing_requirements,
+                )
+            except Exception as e:
+                # 单个文件失败不影响其他文件的提取结果
+                logger.warning("[extract] file=%s failed: %s", filename, e)
+                return idx, filename, e
             return idx, filename, result
 
     tasks = [asyncio.create_task(_worker(i, file_info)) for i, file_info in enumerate(files)]
     results = await asyncio.gather(*tasks)
     results.sort(key=lambda item: item[0])
 
+    errors = [r for _, _, r in results if isinstance(r, Exception)]
+    if errors and len(errors) == len(results):
+        # 全部失败时仍抛出，由调用方给出 warning
+        raise errors[0]
+
     for _, filename, result in results:
-        if not result:
+        if not result or isinstance(result, Exception):
             continue
 
         # 合并提取的字段（后面的文件会覆盖前面的）
@@ -395,12 +405,12 @@ async def extract_info_from_multiple_files(
     }
 
 
-def parse_uploaded_file(content: bytes, file_ext: str, filename: str) -> str:
+def parse_uploaded_file(content: FileContent, file_ext: str, filename: str) -> str:
     """
     解析上传的文件为文本
 
     Args:
-        content: 文件二进制内容
+        content: 文件二进制内容或二进制文件对象
         file_ext: 文件扩展名
         filename: 文件名
 
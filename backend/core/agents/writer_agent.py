@@ -9,6 +9,20 @@ import re
 from .base import BaseAgent
 from backend.core.skills.base import BaseSkill, Section
 
+# 章节后处理逐行调用，正则统一预编译
+_ORDERED_ITEM_RE = re.compile(r'^(\s*)(\d+)([.)、．])\s+(.*)$')
+_TITLE_BRACKETED_RE = re.compile(r'[\(\（\[\【<《].*?[\)\）\]\】>》]')
+_TITLE_NON_WORD_RE = re.compile(r'[^0-9a-zA-Z\u4e00-\u9fff]+')
+_MD_HEADING_RE = re.compile(r'^#{1,6}\s*(.+)$')
+_NUM_HEADING_RE = re.compile(r'^([一二三四五六七八九十\d]+)[、．.\)]\s*(.+)$')
+_BRACKET_HEADING_RE = re.compile(r'^[【\[](.+?)[】\]]$')
+
+
+def _normalize_title(text: str) -> str:
+    # 去掉括号内容与标点，便于匹配“标题+说明”场景
+    text = _TITLE_BRACKETED_RE.sub('', text)
+    return _TITLE_NON_WORD_RE.sub('', text).lower()
+
 
 @dataclass
 class WritingState:
@@ -43,7 +57,7 @@ class WriterAgent(BaseAgent):
         in_list = False
         list_index = 1
         list_indent = None
-        pattern = re.compile(r'^(\s*)(\d+)([.)、．])\s+(.*)$')
+        pattern = _ORDERED_ITEM_RE
 
         for line in lines:
             match = pattern.match(line)
@@ -77,21 +91,16 @@ class WriterAgent(BaseAgent):
         if not lines:
             return content
 
-        def normalize_title(text: str) -> str:
-            # 去掉括号内容与标点，便于匹配“标题+说明”场景
-            text = re.sub(r'[\(\（\[\【<《].*?[\)\）\]\】>》]', '', text)
-            return re.sub(r'[^0-9a-zA-Z\u4e00-\u9fff]+', '', text).lower()
-
-        target = normalize_title(section.title)
+        target = _normalize_title(section.title)
 
         def extract_heading_text(line: str) -> str:
-            md_match = re.match(r'^#{1,6}\s*(.+)$', line)
+            md_match = _MD_HEADING_RE.match(line)
             if md_match:
                 return md_match.group(1).strip()
-            num_match = re.match(r'^([一二三四五六七八九十\\d]+)[、．.\\)]\\s*(.+)$', line)
+            num_match = _NUM_HEADING_RE.match(line)
             if num_match:
                 return num_match.group(2).strip()
-            bracket_match = re.match(r'^[【\\[](.+?)[】\\]]$', line)
+            bracket_match = _BRACKET_HEADING_RE.match(line)
             if bracket_match:
                 return bracket_match.group(1).strip()
             return line.strip()
@@ -107,7 +116,7 @@ class WriterAgent(BaseAgent):
                 continue
 
             heading_text = extract_heading_text(stripped)
-            normalized = normalize_title(heading_text)
+            normalized = _normalize_title(heading_text)
             if normalized == target:
                 # 跳过标题行以及紧随其后的空行
                 i += 1
@@ -131,23 +140,19 @@ class WriterAgent(BaseAgent):
         """移除标题行后紧跟的重复标题文本行"""
         lines = content.splitlines()
 
-        def normalize_title(text: str) -> str:
-            text = re.sub(r'[\(\（\[\【<《].*?[\)\）\]\】>》]', '', text)
-            return re.sub(r'[^0-9a-zA-Z\u4e00-\u9fff]+', '', text).lower()
-
         cleaned = []
         i = 0
         while i < len(lines):
             line = lines[i]
             cleaned.append(line)
 
-            md_match = re.match(r'^#{1,6}\s*(.+)$', line.strip())
+            md_match = _MD_HEADING_RE.match(line.strip())
             if not md_match:
                 i += 1
                 continue
 
             heading_text = md_match.group(1).strip()
-            target = normalize_title(heading_text)
+            target = _normalize_title(heading_text)
 
             j = i + 1
             while j < len(lines) and not lines[j].strip():
@@ -155,7 +160,7 @@ class WriterAgent(BaseAgent):
 
             if j < len(lines):
                 next_line = lines[j].strip()
-                if normalize_title(next_line) == target:
+                if _normalize_title(next_line) == target:
                     lines.pop(j)
                     continue
 
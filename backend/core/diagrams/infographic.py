@@ -13,6 +13,15 @@ from typing import Any, Dict, List, Optional, Tuple
 import math
 import os
 
+try:
+    import oxipng  # pyoxipng
+    OXIPNG_AVAILABLE = True
+except Exception:
+    OXIPNG_AVAILABLE = False
+
+# oxipng 优化级别（0-6）；2 在耗时与压缩率之间较均衡，设为 -1 关闭
+_OXIPNG_LEVEL = int(os.getenv("INFOGRAPHIC_OXIPNG_LEVEL", "2"))
+
 
 def _require_pillow():
     try:
@@ -21,6 +30,16 @@ def _require_pillow():
         raise RuntimeError("Pillow 未安装：请先运行 pip install pillow") from e
 
 
+def _optimize_png(png_bytes: bytes) -> bytes:
+    """无损再压缩 Pillow 输出的 PNG（oxipng 未安装或失败时原样返回）"""
+    if not OXIPNG_AVAILABLE or _OXIPNG_LEVEL < 0:
+        return png_bytes
+    try:
+        return oxipng.optimize_from_memory(png_bytes, level=_OXIPNG_LEVEL)
+    except Exception:
+        return png_bytes
+
+
 def _hex_to_rgba(hex_color: str, alpha: int = 255) -> tuple[int, int, int, int]:
     c = (hex_color or "").strip().lstrip("#")
     if len(c) == 3:
@@ -377,7 +396,7 @@ def _render_technical_route(spec: Dict[str, Any], *, width: int = 1600) -> Tuple
     import io
     bio = io.BytesIO()
     img.convert("RGB").save(bio, format="PNG", optimize=True)
-    png_bytes = bio.getvalue()
+    png_bytes = _optimize_png(bio.getvalue())
 
     # SVG rendering (simple, editable)
     svg_parts: List[str] = []
@@ -589,7 +608,7 @@ def _render_research_framework(spec: Dict[str, Any], *, width: int = 1600) -> Tu
     import io
     bio = io.BytesIO()
     img.convert("RGB").save(bio, format="PNG", optimize=True)
-    png_bytes = bio.getvalue()
+    png_bytes = _optimize_png(bio.getvalue())
 
     # SVG output
     svg_parts: List[str] = []
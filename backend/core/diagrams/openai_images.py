@@ -9,13 +9,24 @@ from __future__ import annotations
 from typing import Optional, Tuple
 import base64
 import logging
-import json
 import re
 
 import httpx
 
+from backend.core.llm.http_client import shared_http_client
+from backend.core.json_utils import dumps_json_bytes as _dumps, loads_json as _loads
+
+try:
+    import pybase64 as _b64
+except Exception:
+    _b64 = base64
+
 logger = logging.getLogger(__name__)
 
+_FENCE_OPEN_RE = re.compile(r"^```(?:json)?\s*")
+_FENCE_CLOSE_RE = re.compile(r"\s*```$")
+_JSON_OBJ_GREEDY_RE = re.compile(r"\{[\s\S]*\}")
+
 
 def _guess_png(image_bytes: bytes) -> bytes:
     """
@@ -51,7 +62,9 @@ def _decode_data_url_to_bytes(url: str) -> Optional[bytes]:
         return None
 
 
-async def _extract_image_bytes_from_response(data: dict, client: httpx.AsyncClient) -> Optional[bytes]:
+async def _extract_image_bytes_from_response(
+    data: dict, client: httpx.AsyncClient, timeout_s: float = 120.0
+) -> Optional[bytes]:
     if not isinstance(data, dict):
         return None
 
@@ -109,7 +122,7 @@ async def _extract_image_bytes_from_response(data: dict, client: httpx.AsyncClie
                 return raw
             if isinstance(item, dict) and isinstance(item.get("url"), str):
                 try:
-                    r2 = await client.get(item["url"])
+                    r2 = await client.get(item["url"], timeout=timeout_s, follow_redirects=True)
                     r2.raise_for_status()
                     return r2.content
                 except Exception:
@@ -173,7 +186,8 @@ async def generate_image_png_via_openai_compatible(
     if api_key:
         headers["Authorization"] = f"Bearer {api_key}"
 
-    async with httpx.AsyncClient(timeout=timeout_s, follow_redirects=True) as client:
+    # 共享连接池（keep-alive / HTTP/2），超时与重定向按请求指定
+    async with shared_http_client() as client:
         image_payloads = [
             {
                 "model": model,
@@ -194,13 +208,19 @@ async def generate_image_png_via_openai_compatible(
         images_unsupported = False
         for payload in image_payloads:
             try:
-                resp = await client.post(images_url, headers=headers, json=payload)
+                resp = await client.post(
+                    images_url,
+                    headers=headers,
+                    content=_dumps(payload),
+                    timeout=timeout_s,
+                    follow_redirects=True,
+                )
                 if resp.status_code == 404:
                     images_unsupported = True
                     break
                 resp.raise_for_status()
-                data = resp.json()
-                raw_bytes = await _extract_image_bytes_from_response(data, client)
+                data = _loads(resp.content)
+                raw_bytes = await _extract_image_bytes_from_response(data, client, timeout_s)
                 if not raw_bytes:
                     raise RuntimeError("成图接口未返回图片数据（images/generations）")
                 return _guess_png(raw_bytes), data
@@ -232,10 +252,16 @@ async def generate_image_png_via_openai_compatible(
         chat_error: Optional[Exception] = None
         for payload in chat_payloads:
             try:
-                resp = await client.post(chat_url, headers=headers, json=payload)
+                resp = await client.post(
+                    chat_url,
+                    headers=headers,
+                    content=_dumps(payload),
+                    timeout=timeout_s,
+                    follow_redirects=True,
+                )
                 resp.raise_for_status()
-                data = resp.json()
-                raw_bytes = await _extract_image_bytes_from_response(data, client)
+                data = _loads(resp.content)
+                raw_bytes = await _extract_image_bytes_from_response(data, client, timeout_s)
                 if not raw_bytes:
                     raise RuntimeError("chat/completions 未返回图片数据")
                 return _guess_png(raw_bytes), data
@@ -273,19 +299,20 @@ def _extract_json_obj(text: str) -> dict:
     raw = (text or "").strip()
     if not raw:
         return {}
-    raw = re.sub(r"^```(?:json)?\s*", "", raw).strip()
-    raw = re.sub(r"\s*```$", "", raw).strip()
+    if raw.startswith("```"):
+        raw = _FENCE_OPEN_RE.sub("", raw)
+        raw = _FENCE_CLOSE_RE.sub("", raw).strip()
     try:
-        obj = json.loads(raw)
+        obj = _loads(raw)
         return obj if isinstance(obj, dict) else {}
     except Exception:
         pass
 
-    m = re.search(r"\{[\s\S]*\}", raw)
+    m = _JSON_OBJ_GREEDY_RE.search(raw)
     if not m:
         return {}
     try:
-        obj = json.loads(m.group(0))
+        obj = _loads(m.group(0))
         return obj if isinstance(obj, dict) else {}
     except Exception:
         return {}
@@ -356,7 +383,7 @@ async def review_image_via_openai_compatible(
     if api_key:
         headers["Authorization"] = f"Bearer {api_key}"
 
-    image_b64 = base64.b64encode(image_bytes).decode("ascii")
+    image_b64 = _b64.b64encode(image_bytes).decode("ascii")
     data_url = f"data:image/png;base64,{image_b64}"
 
     system_text = (
@@ -405,12 +432,19 @@ async def review_image_via_openai_compatible(
 
     last_error: Optional[Exception] = None
 
-    async with httpx.AsyncClient(timeout=timeout_s, follow_redirects=True) as client:
+    # 共享连接池（keep-alive / HTTP/2），超时与重定向按请求指定
+    async with shared_http_client() as client:
         for payload in payloads:
             try:
-                resp = await client.post(url, headers=headers, json=payload)
+                resp = await client.post(
+                    url,
+                    headers=headers,
+                    content=_dumps(payload),
+                    timeout=timeout_s,
+                    follow_redirects=True,
+                )
                 resp.raise_for_status()
-                data = resp.json()
+                data = _loads(resp.content)
 
                 message = (((data.get("choices") or [{}])[0]).get("message") or {})
                 raw_content = _extract_message_text(message.get("content"))
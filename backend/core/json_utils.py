@@ -0,0 +1,34 @@
+"""
+JSON helpers
+
+orjson 为可选依赖：已安装时编解码走 orjson（更快，直接产出 bytes），否则回退标准库。
+可选依赖的探测只在这里做一次，其他模块统一从这里导入。
+"""
+from __future__ import annotations
+
+from typing import Any
+import json
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except Exception:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def loads_json(raw: Any) -> Any:
+    """解析 JSON（str / bytes）：优先 orjson；orjson 拒绝的输入（如 NaN）再交给标准库，行为与 json.loads 一致"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw)
+
+
+def dumps_json_bytes(payload: Any) -> bytes:
+    """编码为 UTF-8 JSON bytes（不转义中文）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
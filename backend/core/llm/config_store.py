@@ -4,7 +4,7 @@ LLM 配置存储
 """
 import json
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from pydantic import BaseModel
 from enum import Enum
 import logging
@@ -44,6 +44,23 @@ class LLMConfig(BaseModel):
 CONFIG_FILE = DATA_DIR / "llm_config.json"
 MODELS_FILE = DATA_DIR / "models.json"
 
+# 进程内缓存：按配置文件 mtime 判断是否失效，热路径上只剩一次 stat
+_CONFIG_CACHE: Optional[Tuple[int, LLMConfig]] = None
+_CREDENTIALS_CACHE: Optional[Tuple[Optional[int], bool]] = None
+
+
+def _config_mtime() -> Optional[int]:
+    try:
+        return CONFIG_FILE.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _invalidate_config_cache() -> None:
+    global _CONFIG_CACHE, _CREDENTIALS_CACHE
+    _CONFIG_CACHE = None
+    _CREDENTIALS_CACHE = None
+
 
 def _load_presets_from_json() -> Dict[str, Any]:
     """从 models.json 加载预设，并转换为系统内部格式"""
@@ -114,8 +131,13 @@ def _load_presets_from_json() -> Dict[str, Any]:
 
 
 def get_llm_config() -> LLMConfig:
-    """获取 LLM 配置"""
-    if CONFIG_FILE.exists():
+    """获取 LLM 配置（文件未变化时直接返回缓存副本，调用方可放心修改）"""
+    global _CONFIG_CACHE
+    mtime = _config_mtime()
+    if mtime is not None:
+        cached = _CONFIG_CACHE
+        if cached is not None and cached[0] == mtime:
+            return cached[1].model_copy(deep=True)
         try:
             with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
                 data = json.load(f)
@@ -127,6 +149,9 @@ def get_llm_config() -> LLMConfig:
                 ):
                     config.base_url = "https://api.deepseek.com/v1"
                     save_llm_config(config)
+                    mtime = _config_mtime()
+                if mtime is not None:
+                    _CONFIG_CACHE = (mtime, config.model_copy(deep=True))
                 return config
         except Exception:
             pass
@@ -142,6 +167,7 @@ def get_llm_config() -> LLMConfig:
 
 def save_llm_config(config: LLMConfig) -> bool:
     """保存 LLM 配置"""
+    _invalidate_config_cache()
     try:
         DATA_DIR.mkdir(parents=True, exist_ok=True)
         with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
@@ -158,8 +184,20 @@ def get_provider_presets() -> dict:
 
 
 def has_llm_credentials(config: Optional[LLMConfig] = None) -> bool:
-    """判断是否已配置可用的 LLM 凭据"""
-    config = config or get_llm_config()
+    """判断是否已配置可用的 LLM 凭据（未传入 config 时按配置文件 mtime 缓存判断结果）"""
+    global _CREDENTIALS_CACHE
+    if config is None:
+        mtime = _config_mtime()
+        cached = _CREDENTIALS_CACHE
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        ready = _has_llm_credentials(get_llm_config())
+        _CREDENTIALS_CACHE = (mtime, ready)
+        return ready
+    return _has_llm_credentials(config)
+
+
+def _has_llm_credentials(config: LLMConfig) -> bool:
     if not config.model or not config.base_url:
         return False
     if config.provider == LLMProviderType.GITHUB_COPILOT:
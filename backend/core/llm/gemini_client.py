@@ -4,6 +4,7 @@ import httpx
 import logging
 from typing import Dict, Any, Optional
 from backend.config import settings
+from backend.core.llm.http_client import shared_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -49,9 +50,9 @@ class GeminiClient:
             }
         }
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with shared_http_client() as client:
             try:
-                response = await client.post(url, headers=headers, json=payload)
+                response = await client.post(url, headers=headers, json=payload, timeout=60.0)
                 response.raise_for_status()
                 data = response.json()
 
@@ -91,9 +92,9 @@ class GeminiClient:
             "generationConfig": {"temperature": 0.3}
         }
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with shared_http_client() as client:
             try:
-                response = await client.post(url, headers=headers, json=payload)
+                response = await client.post(url, headers=headers, json=payload, timeout=60.0)
                 response.raise_for_status()
                 data = response.json()
                 return data.get("candidates", [])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
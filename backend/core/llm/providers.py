@@ -12,6 +12,7 @@ import os
 import random
 
 from .config_store import LLMConfig, LLMProviderType, get_llm_config
+from .http_client import shared_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -262,7 +263,7 @@ class GoogleGeminiProvider(LLMProvider):
             "maxOutputTokens": max_tokens,
         }
 
-        async with httpx.AsyncClient() as client:
+        async with shared_http_client() as client:
             async def _do(timeout_s: float):
                 resp = await client.post(
                     url,
@@ -309,7 +310,7 @@ class GoogleGeminiProvider(LLMProvider):
 
         import json as json_module
 
-        async with httpx.AsyncClient() as client:
+        async with shared_http_client() as client:
             # For streaming, retry only the initial request establishment on 429/5xx/timeouts.
             for attempt in range(6):
                 try:
@@ -385,7 +386,7 @@ class GitHubCopilotProvider(LLMProvider):
         if not force_refresh and self._copilot_token and time.time() < self._token_expires_at - 60:
             return self._copilot_token
 
-        async with httpx.AsyncClient() as client:
+        async with shared_http_client() as client:
             try:
                 # 使用 GitHub OAuth Token 获取 Copilot Token
                 response = await client.get(
@@ -471,7 +472,7 @@ class GitHubCopilotProvider(LLMProvider):
         for attempt in range(2):  # 最多重试一次
             headers, payload = await self._make_request(messages, temp, max_tokens, stream=False)
 
-            async with httpx.AsyncClient() as client:
+            async with shared_http_client() as client:
                 response = await client.post(
                     "https://api.githubcopilot.com/chat/completions",
                     json=payload,
@@ -505,7 +506,7 @@ class GitHubCopilotProvider(LLMProvider):
         temp = temperature or self.config.temperature
         headers, payload = await self._make_request(messages, temp, max_tokens, stream=True)
 
-        async with httpx.AsyncClient() as client:
+        async with shared_http_client() as client:
             try:
                 async with client.stream(
                     "POST",
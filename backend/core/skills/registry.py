@@ -4,11 +4,26 @@ Skill 注册表
 """
 from typing import Dict, List, Optional, Type
 from pathlib import Path
+from functools import lru_cache
 
 from .base import BaseSkill, SkillMetadata, SkillRole
 from .base_writing import BaseWritingAugmentedSkill
 
 
+def _prime_skill_caches(skill: BaseSkill) -> BaseSkill:
+    """
+    预计算必填字段 / 字段 id 索引，并重置挂在实例上的派生缓存
+    （字段列表 / system prompt），避免每次请求都重新遍历
+    """
+    required = [f for f in skill.requirement_fields if f.required]
+    skill._required_field_ids = frozenset(f.id for f in required)
+    skill._required_field_names = {f.id: f.name for f in required}
+    skill._field_index = {f.id: f for f in skill.requirement_fields}
+    skill._skill_fields_cache = None
+    skill._resolved_system_prompt = None
+    return skill
+
+
 class SkillRegistry:
     """
     Skill 注册表
@@ -35,7 +50,7 @@ class SkillRegistry:
         """
         instance = skill_class()
         skill_id = instance.metadata.id
-        self._skills[skill_id] = instance
+        self._skills[skill_id] = _prime_skill_caches(instance)
         self._skill_classes[skill_id] = skill_class
 
     def register_instance(self, skill: BaseSkill) -> None:
@@ -46,7 +61,7 @@ class SkillRegistry:
             skill: Skill 实例
         """
         skill_id = skill.metadata.id
-        self._skills[skill_id] = skill
+        self._skills[skill_id] = _prime_skill_caches(skill)
 
     def get(self, skill_id: str) -> Optional[BaseSkill]:
         """获取 Skill 实例"""
@@ -58,7 +73,7 @@ class SkillRegistry:
         if self._file_loader:
             skill = self._file_loader.get_skill(skill_id)
             if skill:
-                self._skills[skill_id] = skill
+                self._skills[skill_id] = _prime_skill_caches(skill)
                 return skill
 
         return None
@@ -129,7 +144,7 @@ class SkillRegistry:
 
         # 注册到主注册表
         for skill_id, skill in loaded_skills.items():
-            self._skills[skill_id] = skill
+            self._skills[skill_id] = _prime_skill_caches(skill)
 
         return len(loaded_skills)
 
@@ -147,21 +162,15 @@ class SkillRegistry:
             # 从文件重新加载
             skill = self._file_loader.load_skill(skill_id)
             if skill:
-                self._skills[skill_id] = skill
+                self._skills[skill_id] = _prime_skill_caches(skill)
                 return skill
         return None
 
 
-# 全局注册表实例
-_registry: Optional[SkillRegistry] = None
-
-
+@lru_cache(maxsize=1)
 def get_registry() -> SkillRegistry:
     """获取全局 Skill 注册表"""
-    global _registry
-    if _registry is None:
-        _registry = SkillRegistry()
-    return _registry
+    return SkillRegistry()
 
 
 def register_skill(skill_class: Type[BaseSkill]):
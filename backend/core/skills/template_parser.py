@@ -2,17 +2,37 @@
 模板文件解析器
 支持解析 md, doc, docx, pdf, txt, pptx 等格式的模板文件
 """
+import io
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, BinaryIO, Union
 from pathlib import Path
 
+# 文件内容：内存中的 bytes，或可 seek 的二进制文件对象（如上传的临时文件）
+FileContent = Union[bytes, BinaryIO]
 
-def parse_template_file(content: bytes, file_ext: str, filename: str) -> str:
+
+def _as_stream(content: FileContent) -> BinaryIO:
+    """转换为可读的二进制流；文件对象直接复用，避免整体读入内存"""
+    if isinstance(content, (bytes, bytearray)):
+        return io.BytesIO(content)
+    content.seek(0)
+    return content
+
+
+def _as_bytes(content: FileContent) -> bytes:
+    """转换为 bytes（文本类格式需要整体解码）"""
+    if isinstance(content, (bytes, bytearray)):
+        return bytes(content)
+    content.seek(0)
+    return content.read()
+
+
+def parse_template_file(content: FileContent, file_ext: str, filename: str) -> str:
     """
     解析模板文件内容
 
     Args:
-        content: 文件二进制内容
+        content: 文件二进制内容或二进制文件对象
         file_ext: 文件扩展名
         filename: 文件名
 
@@ -21,10 +41,11 @@ def parse_template_file(content: bytes, file_ext: str, filename: str) -> str:
     """
     if file_ext in ['.md', '.txt']:
         # 直接解码文本文件
+        raw = _as_bytes(content)
         try:
-            return content.decode('utf-8')
+            return raw.decode('utf-8')
         except UnicodeDecodeError:
-            return content.decode('gbk', errors='ignore')
+            return raw.decode('gbk', errors='ignore')
 
     elif file_ext == '.docx':
         return parse_docx(content)
@@ -43,15 +64,14 @@ def parse_template_file(content: bytes, file_ext: str, filename: str) -> str:
         raise ValueError(f"Unsupported file type: {file_ext}")
 
 
-def parse_docx(content: bytes) -> str:
+def parse_docx(content: FileContent) -> str:
     """解析 DOCX 文件"""
     try:
         import zipfile
-        import io
         from xml.etree import ElementTree as ET
 
         # DOCX 是 ZIP 格式
-        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        with zipfile.ZipFile(_as_stream(content)) as zf:
             # 读取 document.xml
             with zf.open('word/document.xml') as doc:
                 tree = ET.parse(doc)
@@ -78,9 +98,10 @@ def parse_docx(content: bytes) -> str:
         raise ValueError(f"Failed to parse DOCX file: {str(e)}")
 
 
-def parse_doc(content: bytes) -> str:
+def parse_doc(content: FileContent) -> str:
     """解析 DOC 文件 (简单文本提取)"""
     try:
+        content = _as_bytes(content)
         # 尝试提取 DOC 文件中的可读文本
         # DOC 是二进制格式，这里使用简单的文本提取方法
         text_parts = []
@@ -119,13 +140,12 @@ def parse_doc(content: bytes) -> str:
         raise ValueError(f"Failed to parse DOC file: {str(e)}. Please convert to DOCX format.")
 
 
-def parse_pptx(content: bytes) -> str:
+def parse_pptx(content: FileContent) -> str:
     """解析 PPTX 文件"""
     try:
-        import io
         from pptx import Presentation
 
-        presentation = Presentation(io.BytesIO(content))
+        presentation = Presentation(_as_stream(content))
         text_parts = []
 
         for slide in presentation.slides:
@@ -149,16 +169,14 @@ def parse_pptx(content: bytes) -> str:
         raise ValueError(f"Failed to parse PPTX file: {str(e)}")
 
 
-def parse_pdf(content: bytes) -> str:
+def parse_pdf(content: FileContent) -> str:
     """解析 PDF 文件"""
     try:
-        import io
-
         # 优先使用 pypdf（更活跃的维护）
         try:
             from pypdf import PdfReader  # type: ignore
 
-            reader = PdfReader(io.BytesIO(content))
+            reader = PdfReader(_as_stream(content))
             text_parts = []
             for page in reader.pages:
                 text = page.extract_text() or ""
@@ -172,7 +190,7 @@ def parse_pdf(content: bytes) -> str:
         try:
             import PyPDF2  # type: ignore
 
-            reader = PyPDF2.PdfReader(io.BytesIO(content))
+            reader = PyPDF2.PdfReader(_as_stream(content))
             text_parts = []
             for page in reader.pages:
                 text = page.extract_text() or ""
@@ -183,7 +201,7 @@ def parse_pdf(content: bytes) -> str:
             pass
 
         # 最后退化：简单文本流提取（效果有限，扫描版/图片 PDF 可能为空）
-        text = content.decode("latin-1", errors="ignore")
+        text = _as_bytes(content).decode("latin-1", errors="ignore")
         text_parts = re.findall(r"\(([^)]+)\)", text)
         return "\n".join(text_parts).strip()
 
@@ -5,6 +5,7 @@
 from typing import Dict, Any, Optional, AsyncGenerator
 from dataclasses import asdict
 from datetime import datetime
+from functools import lru_cache
 import asyncio
 import logging
 import os
@@ -730,8 +731,7 @@ class SimpleWorkflow:
             return markdown.strip() + "\n", {"changed": False, "reason": "exception"}
 
 
-# 全局工作流实例
-_workflow: Optional[SimpleWorkflow] = None
+# 全局会话存储实例
 _store = None
 
 
@@ -744,9 +744,7 @@ def get_store():
     return _store
 
 
+@lru_cache(maxsize=1)
 def get_workflow() -> SimpleWorkflow:
     """获取全局工作流实例"""
-    global _workflow
-    if _workflow is None:
-        _workflow = SimpleWorkflow(store=get_store())
-    return _workflow
+    return SimpleWorkflow(store=get_store())
@@ -2,7 +2,7 @@
 会话状态定义
 独立文件以避免循环导入
 """
-from typing import Dict, Optional, List
+from typing import Any, Dict, Optional, List
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
 
@@ -17,6 +17,34 @@ class UploadedFile:
     uploaded_at: str = field(default_factory=lambda: datetime.now().isoformat())
 
 
+@dataclass(slots=True)
+class DiagramRecord:
+    """会话内一张图示的元数据（SessionState.diagrams 中以 to_dict() 结果存储，便于 JSON 持久化）"""
+    id: str
+    title: str
+    diagram_type: str
+    mode: str
+    has_png: bool = True
+    has_svg: bool = False
+    spec: Optional[Dict[str, Any]] = None
+    meta: Dict[str, Any] = field(default_factory=dict)
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat(timespec="seconds"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（浅拷贝字段，spec/meta 本身已是新建的 JSON 结构，无需 asdict 的递归深拷贝）"""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "diagram_type": self.diagram_type,
+            "mode": self.mode,
+            "created_at": self.created_at,
+            "has_png": self.has_png,
+            "has_svg": self.has_svg,
+            "spec": self.spec,
+            "meta": self.meta,
+        }
+
+
 @dataclass
 class SessionState:
     """会话状态"""
@@ -1,14 +1,84 @@
 """
 数据库支持的会话存储
 """
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
+from collections import OrderedDict
 from datetime import datetime
 import json
+import os
+import threading
+import time
 
 from backend.models.database import Database, Session as SessionModel, get_database
 from backend.core.workflow.state import SessionState
 
 
+def _clone_json(value: Any) -> Any:
+    """
+    复制 JSON 结构（dict/list 嵌套 + 标量）。
+    快照内容都来自 JSON 字段，比 copy.deepcopy 省去 memo 与类型分派开销。
+    """
+    if isinstance(value, dict):
+        return {k: _clone_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone_json(v) for v in value]
+    return value
+
+
+class _SessionSnapshotCache:
+    """
+    进程内会话快照缓存（LRU + TTL），挡在数据库前面，热会话不再每次查库。
+
+    缓存的是 to_dict() 快照而非对象本身，每次命中都返回新的 SessionState，
+    避免并发请求之间共享未保存的修改。多 worker 部署请设置 SESSION_CACHE_TTL=0 关闭。
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._data.get(session_id)
+            if item is None:
+                return None
+            ts, snapshot = item
+            if time.monotonic() - ts > self.ttl:
+                del self._data[session_id]
+                return None
+            self._data.move_to_end(session_id)
+        return SessionState.from_dict(_clone_json(snapshot))
+
+    def put(self, session: SessionState):
+        if not self.enabled:
+            return
+        snapshot = session.to_dict()
+        with self._lock:
+            self._data[session.session_id] = (time.monotonic(), snapshot)
+            self._data.move_to_end(session.session_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+
+# 所有 DatabaseSessionStore 实例共享，保证 sessions 路由的删除对 workflow 立即可见
+_SESSION_CACHE = _SessionSnapshotCache(
+    maxsize=int(os.getenv("SESSION_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SESSION_CACHE_TTL", "30")),
+)
+
+
 class DatabaseSessionStore:
     """数据库支持的会话存储"""
 
@@ -17,12 +87,16 @@ class DatabaseSessionStore:
 
     def get(self, session_id: str) -> Optional[SessionState]:
         """获取会话"""
+        cached = _SESSION_CACHE.get(session_id)
+        if cached is not None:
+            return cached
+
         with self.db.get_session() as db_session:
             record = db_session.query(SessionModel).filter(SessionModel.id == session_id).first()
             if not record:
                 return None
 
-            return SessionState(
+            session = SessionState(
                 session_id=record.id,
                 skill_id=record.skill_id,
                 phase=record.phase,
@@ -42,9 +116,12 @@ class DatabaseSessionStore:
                 updated_at=record.updated_at.isoformat() if record.updated_at else datetime.now().isoformat(),
                 error=record.error,
             )
+        _SESSION_CACHE.put(session)
+        return session
 
     def save(self, session: SessionState):
         """保存会话"""
+        now = datetime.utcnow()
         with self.db.get_session() as db_session:
             record = db_session.query(SessionModel).filter(SessionModel.id == session.session_id).first()
 
@@ -65,7 +142,7 @@ class DatabaseSessionStore:
                 record.diagrams = json.dumps(getattr(session, "diagrams", []) or [])
                 record.final_document = session.final_document
                 record.error = session.error
-                record.updated_at = datetime.utcnow()
+                record.updated_at = now
             else:
                 # 创建新记录
                 record = SessionModel(
@@ -85,11 +162,19 @@ class DatabaseSessionStore:
                     diagrams=json.dumps(getattr(session, "diagrams", []) or []),
                     final_document=session.final_document,
                     error=session.error,
+                    created_at=now,
+                    updated_at=now,
                 )
                 db_session.add(record)
 
+            created_at = record.created_at.isoformat() if record.created_at else now.isoformat()
             db_session.commit()
 
+        # 与数据库读回的时间戳保持一致
+        session.created_at = created_at
+        session.updated_at = now.isoformat()
+        _SESSION_CACHE.put(session)
+
     def delete(self, session_id: str):
         """删除会话"""
         with self.db.get_session() as db_session:
@@ -97,6 +182,7 @@ class DatabaseSessionStore:
             if record:
                 db_session.delete(record)
                 db_session.commit()
+        _SESSION_CACHE.invalidate(session_id)
 
     def list_all(self, limit: int = 100) -> List[SessionState]:
         """列出所有会话"""